@@ -0,0 +1,71 @@
+"""
+Compare the built-in hunk applier with `whatthepatch.apply_diff`.
+
+    python -m benchmarks.bench_applier [--lines 200000] [--hunks 500]
+"""
+
+import argparse
+import time
+
+import whatthepatch
+
+from poetry_patches.applier import apply_hunks, parse_hunks
+
+
+def make_file(lines: int) -> str:
+    return "".join(f"line {i} of a large generated module\n" for i in range(lines))
+
+
+def make_diff(lines: int, hunks: int) -> str:
+    step = lines // hunks
+    chunks = ["--- a/large.py\n", "+++ b/large.py\n"]
+    for start in range(1, lines - 3, step):
+        chunks.append(f"@@ -{start},3 +{start},3 @@\n")
+        chunks.append(f" line {start - 1} of a large generated module\n")
+        chunks.append(f"-line {start} of a large generated module\n")
+        chunks.append(f"+line {start} of a patched module\n")
+        chunks.append(f" line {start + 1} of a large generated module\n")
+    return "".join(chunks)
+
+
+def measure(function, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=200_000)
+    parser.add_argument("--hunks", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    text = make_file(args.lines)
+    content = text.encode()
+    diff_text = make_diff(args.lines, args.hunks)
+    diff = next(whatthepatch.parse_patch(diff_text))
+
+    def whatthepatch_apply() -> bytes:
+        lines = whatthepatch.apply_diff(diff, content.decode())
+        return "\n".join(lines).encode()
+
+    def builtin_apply() -> bytes:
+        return apply_hunks(content, parse_hunks(diff.text))
+
+    assert whatthepatch_apply() == builtin_apply().removesuffix(b"\n")
+
+    size = len(content) / 1024 / 1024
+    print(f"{size:.1f} MiB, {args.lines} lines, {args.hunks} hunks")
+    for name, function in (
+        ("whatthepatch", whatthepatch_apply),
+        ("builtin", builtin_apply),
+    ):
+        print(f"{name:>12}: {measure(function, args.repeat) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
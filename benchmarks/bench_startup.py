@@ -0,0 +1,70 @@
+"""
+Measure the startup cost the plugin adds to every `poetry` invocation.
+
+    python -m benchmarks.bench_startup [--repeat 20]
+
+Both interpreters create Poetry's application, the second one also imports
+and activates the plugin, like Poetry does on startup.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+BASELINE = """
+from poetry.console.application import Application
+Application()
+"""
+
+PLUGIN = """
+import sys
+from poetry.console.application import Application
+before = set(sys.modules)
+from poetry_patches.plugins import PoetryPatchesPlugin
+PoetryPatchesPlugin().activate(Application())
+"""
+
+# Imported only when a patches command runs.
+HEAVY = ["requests", "whatthepatch", "poetry_patches.patcher", "poetry.utils.env"]
+
+
+def measure(code: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def imported(modules: list[str]) -> list[str]:
+    """
+    Get the modules activating the plugin imports, out of the given ones.
+    """
+    code = (
+        f"{PLUGIN}\nimport json\nprint(json.dumps(sorted(set(sys.modules) - before)))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+    return [module for module in json.loads(output) if module in modules]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    baseline = measure(BASELINE, args.repeat)
+    plugin = measure(PLUGIN, args.repeat)
+    print(f"{'poetry':>12}: {baseline * 1000:8.1f} ms")
+    print(
+        f"{'plugin':>12}: {plugin * 1000:8.1f} ms (+{(plugin - baseline) * 1000:.1f})"
+    )
+    print(f"{'heavy':>12}: {', '.join(imported(HEAVY)) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
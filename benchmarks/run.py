@@ -0,0 +1,277 @@
+"""
+Benchmark apply, revert and the meta I/O on synthetic trees.
+
+    python -m benchmarks.run [--scale 0.1] [--repeat 3] [--only large_file]
+    python -m benchmarks.run --save-baseline
+    python -m benchmarks.run --compare
+
+Every scenario reports the best time, the throughput and the peak traced
+memory of each phase. The results can be saved as `benchmarks/baseline.json`
+and compared against it later, to catch regressions between versions.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from contextlib import contextmanager
+from pathlib import Path
+
+from cleo.io.null_io import NullIO
+
+from benchmarks import synthetic
+from poetry_patches.patcher import STREAM_SIZE, PoetryPatcher
+from poetry_patches.state.backup import Backup
+from poetry_patches.state.meta import Meta
+from poetry_patches.state.sqlite import SqliteMeta
+from poetry_patches.status import get_stat, get_status
+from poetry_patches.utils import hash_file
+
+BASELINE = Path(__file__).parent / "baseline.json"
+
+
+class Phases:
+    """
+    Times the phases of a scenario, and traces their peak memory if enabled.
+    """
+
+    def __init__(self, trace: bool):
+        self.trace = trace
+        self.results: dict[str, dict[str, float]] = {}
+
+    @contextmanager
+    def phase(self, name: str, items: int):
+        if self.trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            result = {"seconds": seconds, "items_per_second": items / seconds}
+            if self.trace:
+                result = {"peak_mib": tracemalloc.get_traced_memory()[1] / 2**20}
+                tracemalloc.stop()
+            self.results[name] = result
+
+
+def make_patcher(directory: Path) -> PoetryPatcher:
+    backups = directory / "backups"
+    backups.mkdir()
+    return PoetryPatcher(None, NullIO(), Backup(Meta(directory / "meta.json"), backups))
+
+
+def apply_and_revert(
+    phases: Phases,
+    directory: Path,
+    uris: list[str],
+    files: int,
+    stream_size: int = STREAM_SIZE,
+) -> None:
+    root = directory / "site-packages"
+    patcher = make_patcher(directory)
+    patcher.stream_size = stream_size
+
+    with phases.phase("parse", files):
+        tasks = patcher.parse_patches(root, uris)
+    with phases.phase("apply", files):
+        with patcher.backup.transaction():
+            patcher.run_tasks(tasks)
+    assert patcher.errors == 0, "the synthetic patches failed to apply"
+    with phases.phase("revert", files):
+        patcher.backup.revert()
+
+
+def many_files(phases: Phases, directory: Path, scale: float) -> None:
+    files, lines = int(2000 * scale), 200
+    paths = synthetic.make_tree(directory / "site-packages", files, lines)
+    diffs = [synthetic.make_update(path, lines, 1) for path in paths]
+    uris = synthetic.write_patches(directory / "patches", diffs, 100)
+    apply_and_revert(phases, directory, uris, files)
+
+
+def many_hunks(phases: Phases, directory: Path, scale: float) -> None:
+    files, lines = int(20 * scale) or 1, 5000
+    paths = synthetic.make_tree(directory / "site-packages", files, lines)
+    diffs = [synthetic.make_update(path, lines, 500) for path in paths]
+    uris = synthetic.write_patches(directory / "patches", diffs, 1)
+    apply_and_revert(phases, directory, uris, files)
+
+
+def large_file(phases: Phases, directory: Path, scale: float) -> None:
+    # About 64 bytes per line, 16 MiB with the default scale.
+    lines = int(250_000 * scale)
+    paths = synthetic.make_tree(directory / "site-packages", 1, lines)
+    diffs = [synthetic.make_update(paths[0], lines, 100)]
+    uris = synthetic.write_patches(directory / "patches", diffs, 1)
+    apply_and_revert(phases, directory, uris, 1)
+
+
+def large_file_stream(phases: Phases, directory: Path, scale: float) -> None:
+    lines = int(250_000 * scale)
+    paths = synthetic.make_tree(directory / "site-packages", 1, lines)
+    diffs = [synthetic.make_update(paths[0], lines, 100)]
+    uris = synthetic.write_patches(directory / "patches", diffs, 1)
+    # Streaming is forced, the file is under `STREAM_SIZE` and `apply` keeps it
+    # in memory by default, like `large_file`.
+    apply_and_revert(phases, directory, uris, 1, stream_size=0)
+
+
+def renames_and_deletes(phases: Phases, directory: Path, scale: float) -> None:
+    files, lines = int(2000 * scale), 50
+    paths = synthetic.make_tree(directory / "site-packages", files, lines)
+    diffs = []
+    for i, path in enumerate(paths):
+        if i % 2:
+            diffs.append(synthetic.make_rename(path, path.replace(".py", "_2.py")))
+        else:
+            diffs.append(synthetic.make_delete(path, lines))
+            diffs.append(synthetic.make_create(path.replace(".py", "_3.py"), lines))
+    uris = synthetic.write_patches(directory / "patches", diffs, 100)
+    apply_and_revert(phases, directory, uris, files)
+
+
+def status(phases: Phases, directory: Path, scale: float) -> None:
+    files = int(5000 * scale)
+    root = directory / "site-packages"
+    paths = [root / path for path in synthetic.make_tree(root, files, 20)]
+    package = {
+        "files": {str(path): hash_file(path) for path in paths},
+        "stats": {str(path): get_stat(path) for path in paths},
+    }
+    # A tenth of the files were touched, they have to be hashed.
+    for path in paths[::10]:
+        os.utime(path, ns=(0, 0))
+
+    with phases.phase("status", files):
+        get_status(package)
+
+
+def meta(phases: Phases, directory: Path, scale: float) -> None:
+    entries = int(20_000 * scale)
+    meta = Meta(directory / "meta.json")
+
+    with phases.phase("write", entries):
+        with meta.transaction():
+            for i in range(entries):
+                meta.set_backup(f"/site-packages/package/module_{i}.py", None)
+    with phases.phase("load", entries):
+        Meta(directory / "meta.json").load()
+
+
+def meta_sqlite(phases: Phases, directory: Path, scale: float) -> None:
+    entries = int(20_000 * scale)
+    meta = SqliteMeta(directory / "meta.db")
+
+    with phases.phase("write", entries):
+        with meta.transaction():
+            for i in range(entries):
+                meta.set_backup(f"/site-packages/package/module_{i}.py", None)
+    # A lookup is indexed, nothing is loaded up front.
+    with phases.phase("lookup", entries):
+        for i in range(entries):
+            meta.has_backup(f"/site-packages/package/module_{i}.py")
+    meta.close()
+
+
+SCENARIOS: dict[str, Callable[[Phases, Path, float], None]] = {
+    "many_files": many_files,
+    "many_hunks": many_hunks,
+    "large_file": large_file,
+    "large_file_stream": large_file_stream,
+    "renames_and_deletes": renames_and_deletes,
+    "status": status,
+    "meta": meta,
+    "meta_sqlite": meta_sqlite,
+}
+
+
+def run(name: str, scale: float, repeat: int) -> dict[str, dict[str, float]]:
+    best: dict[str, dict[str, float]] = {}
+
+    for i in range(repeat + 1):
+        # The last run only traces memory, tracing slows everything down.
+        phases = Phases(trace=i == repeat)
+        with tempfile.TemporaryDirectory() as directory:
+            SCENARIOS[name](phases, Path(directory), scale)
+
+        for phase, result in phases.results.items():
+            current = best.setdefault(phase, {})
+            if "seconds" in result and result["seconds"] < current.get(
+                "seconds", float("inf")
+            ):
+                current.update(result)
+            if "peak_mib" in result:
+                current["peak_mib"] = result["peak_mib"]
+
+    return best
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    """
+    Print the ratios against the baseline, return false on a regression.
+    """
+    ok = True
+    for name, phases in results["scenarios"].items():
+        for phase, result in phases.items():
+            base = baseline["scenarios"].get(name, {}).get(phase)
+            if base is None:
+                continue
+            ratio = result["seconds"] / base["seconds"]
+            regressed = ratio > threshold
+            ok = ok and not regressed
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{name:>20} {phase:>8}: {ratio:6.2f}x{flag}")
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", action="append", choices=list(SCENARIOS))
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args()
+    # The last run only traces memory, the times come from the others.
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    results = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "scale": args.scale,
+        "scenarios": {},
+    }
+    for name in args.only or SCENARIOS:
+        results["scenarios"][name] = phases = run(name, args.scale, args.repeat)
+        for phase, result in phases.items():
+            print(
+                f"{name:>20} {phase:>8}: {result['seconds'] * 1000:9.1f} ms"
+                f" {result['items_per_second']:12.0f} items/s"
+                f" {result['peak_mib']:8.1f} MiB peak"
+            )
+
+    text = json.dumps(results, indent=4)
+    if args.output:
+        args.output.write_text(text)
+    if args.save_baseline:
+        BASELINE.write_text(text)
+    if args.compare:
+        baseline = json.loads(BASELINE.read_text())
+        if baseline["scale"] != args.scale:
+            print("The baseline was recorded with another --scale.")
+            return 1
+        return 0 if compare(results, baseline, args.threshold) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
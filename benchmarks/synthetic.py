@@ -0,0 +1,96 @@
+"""
+Generate synthetic site-packages trees and patch series for the benchmarks.
+"""
+
+from pathlib import Path
+
+
+def make_line(i: int) -> str:
+    return f"    value_{i} = compute(value_{i - 1}, {i})  # generated line {i}\n"
+
+
+def make_lines(count: int) -> list[str]:
+    return [make_line(i) for i in range(count)]
+
+
+def make_tree(root: Path, files: int, lines: int) -> list[str]:
+    """
+    Write `files` modules of `lines` lines each, return their relative paths.
+    """
+    content = "".join(make_lines(lines))
+    paths = []
+    for i in range(files):
+        path = f"package_{i // 100}/module_{i}.py"
+        file = root / path
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_text(content)
+        paths.append(path)
+    return paths
+
+
+def make_update(path: str, lines: int, hunks: int) -> str:
+    """
+    A diff changing one line in each of `hunks` evenly spaced places.
+    """
+    chunks = [
+        f"diff --git a/{path} b/{path}\n",
+        f"--- a/{path}\n",
+        f"+++ b/{path}\n",
+    ]
+    step = max(lines // hunks, 4)
+    for start in range(2, lines - 2, step)[:hunks]:
+        chunks.append(f"@@ -{start},3 +{start},3 @@\n")
+        # Line `start` is `make_line(start - 1)`.
+        chunks.append(" " + make_line(start - 1))
+        chunks.append("-" + make_line(start))
+        chunks.append(f"+    patched_{start} = True\n")
+        chunks.append(" " + make_line(start + 1))
+    return "".join(chunks)
+
+
+def make_rename(old: str, new: str) -> str:
+    return (
+        f"diff --git a/{old} b/{new}\n"
+        "similarity index 100%\n"
+        f"rename from {old}\n"
+        f"rename to {new}\n"
+    )
+
+
+def make_delete(path: str, lines: int) -> str:
+    chunks = [
+        f"diff --git a/{path} b/{path}\n",
+        "deleted file mode 100644\n",
+        "index 1111111..0000000\n",
+        f"--- a/{path}\n",
+        "+++ /dev/null\n",
+        f"@@ -1,{lines} +0,0 @@\n",
+    ]
+    chunks.extend("-" + line for line in make_lines(lines))
+    return "".join(chunks)
+
+
+def make_create(path: str, lines: int) -> str:
+    chunks = [
+        f"diff --git a/{path} b/{path}\n",
+        "new file mode 100644\n",
+        "index 0000000..1111111\n",
+        "--- /dev/null\n",
+        f"+++ b/{path}\n",
+        f"@@ -0,0 +1,{lines} @@\n",
+    ]
+    chunks.extend("+" + line for line in make_lines(lines))
+    return "".join(chunks)
+
+
+def write_patches(directory: Path, diffs: list[str], per_patch: int) -> list[str]:
+    """
+    Split the diffs into patch files of `per_patch` diffs, return their paths.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    uris = []
+    for i in range(0, len(diffs), per_patch):
+        patch = directory / f"{i // per_patch:04}.diff"
+        patch.write_text("".join(diffs[i : i + per_patch]))
+        uris.append(str(patch))
+    return uris
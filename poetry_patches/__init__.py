@@ -1,5 +1,10 @@
 from pathlib import Path
 
+from poetry.locations import DEFAULT_CACHE_DIR
+
 DIRECTORY = Path(".poetry-patches")
 META = DIRECTORY / "meta.json"
 BACKUPS = DIRECTORY / "backups"
+DISTRIBUTIONS = DIRECTORY / "distributions.json"
+ENVS = DIRECTORY / "envs"
+CACHE = DEFAULT_CACHE_DIR / "poetry-patches"
@@ -0,0 +1,182 @@
+import re
+import shutil
+from typing import BinaryIO
+
+from whatthepatch.exceptions import HunkApplyException
+
+HUNK = re.compile(rb"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+NEWLINE = re.compile(rb"\n")
+
+
+class Hunk:
+    """
+    A hunk of a unified diff.
+
+    Every line is a `[kind, text, eol]` list, where `kind` is `b" "`, `b"-"` or
+    `b"+"` and `eol` is false if the line has no newline at the end of the file.
+    """
+
+    __slots__ = ("old_start", "old_count", "lines")
+
+    def __init__(self, old_start: int, old_count: int, lines: list[list]):
+        self.old_start = old_start
+        self.old_count = old_count
+        self.lines = lines
+
+
+def parse_hunks(text: str) -> list[Hunk]:
+    """
+    Parse the hunks of a unified diff.
+    """
+    lines = text.encode().split(b"\n")
+    hunks = []
+    i = 0
+
+    while i < len(lines):
+        match = HUNK.match(lines[i])
+        i += 1
+        if match is None:
+            continue
+
+        old_start, old_count = int(match[1]), int(match[2] or 1)
+        old, new = old_count, int(match[4] or 1)
+        hunk = Hunk(old_start, old_count, [])
+
+        while i < len(lines) and (old > 0 or new > 0 or lines[i][:1] == b"\\"):
+            line = lines[i]
+            kind = line[:1]
+            if kind == b"\\":
+                # "\ No newline at end of file"
+                if hunk.lines:
+                    hunk.lines[-1][2] = False
+            elif kind in (b" ", b"") and old > 0 and new > 0:
+                hunk.lines.append([b" ", line[1:], True])
+                old, new = old - 1, new - 1
+            elif kind == b"-" and old > 0:
+                hunk.lines.append([b"-", line[1:], True])
+                old -= 1
+            elif kind == b"+" and new > 0:
+                hunk.lines.append([b"+", line[1:], True])
+                new -= 1
+            else:
+                break
+            i += 1
+
+        hunks.append(hunk)
+
+    return hunks
+
+
+def apply_hunks(content: bytes, hunks: list[Hunk]) -> bytes:
+    """
+    Apply hunks to the content of a file in a single pass.
+
+    The line offsets are indexed once, unchanged lines are copied as they are,
+    added lines get the line ending of the file.
+    """
+    offsets = [0]
+    offsets.extend(match.end() for match in NEWLINE.finditer(content))
+    if offsets[-1] != len(content):
+        offsets.append(len(content))
+    count = len(offsets) - 1
+
+    first = content.find(b"\n")
+    eol = b"\r\n" if first > 0 and content[first - 1 : first] == b"\r" else b"\n"
+
+    chunks = []
+    position = 0
+
+    for number, hunk in enumerate(hunks, start=1):
+        start = hunk.old_start - 1 if hunk.old_count else hunk.old_start
+        if start < position or start > count:
+            raise HunkApplyException(
+                f"hunk #{number} starts at line {hunk.old_start}, out of range"
+            )
+
+        chunks.append(content[offsets[position] : offsets[start]])
+        position = start
+
+        for kind, text, has_eol in hunk.lines:
+            if kind == b"+":
+                chunks.append(text + eol if has_eol else text)
+                continue
+
+            if position >= count:
+                raise HunkApplyException(
+                    f"line {position + 1} is out of range, in hunk #{number}"
+                )
+            line = content[offsets[position] : offsets[position + 1]]
+            if strip(line) != text:
+                raise HunkApplyException(
+                    f'line {position + 1}, "{text.decode(errors="replace")}"'
+                    f" does not match, in hunk #{number}"
+                )
+            if kind == b" ":
+                chunks.append(line)
+            position += 1
+
+    chunks.append(content[offsets[position] :])
+    return b"".join(chunks)
+
+
+def strip(line: bytes) -> bytes:
+    if line.endswith(b"\n"):
+        line = line[:-1]
+    if line.endswith(b"\r"):
+        line = line[:-1]
+    return line
+
+
+def apply_hunks_stream(src: BinaryIO, dst: BinaryIO, hunks: list[Hunk]) -> None:
+    """
+    Apply hunks to a file while copying it, line by line.
+
+    The same as `apply_hunks`, but only the current line is held in memory.
+    """
+    first = src.readline()
+    eol = b"\r\n" if first.endswith(b"\r\n") else b"\n"
+    pending = [first] if first else []
+
+    def read_line() -> bytes | None:
+        if pending:
+            return pending.pop()
+        return src.readline() or None
+
+    position = 0
+
+    for number, hunk in enumerate(hunks, start=1):
+        start = hunk.old_start - 1 if hunk.old_count else hunk.old_start
+        if start < position:
+            raise HunkApplyException(
+                f"hunk #{number} starts at line {hunk.old_start}, out of range"
+            )
+
+        while position < start:
+            if (line := read_line()) is None:
+                raise HunkApplyException(
+                    f"hunk #{number} starts at line {hunk.old_start}, out of range"
+                )
+            dst.write(line)
+            position += 1
+
+        for kind, text, has_eol in hunk.lines:
+            if kind == b"+":
+                dst.write(text + eol if has_eol else text)
+                continue
+
+            if (line := read_line()) is None:
+                raise HunkApplyException(
+                    f"line {position + 1} is out of range, in hunk #{number}"
+                )
+            if strip(line) != text:
+                raise HunkApplyException(
+                    f'line {position + 1}, "{text.decode(errors="replace")}"'
+                    f" does not match, in hunk #{number}"
+                )
+            if kind == b" ":
+                dst.write(line)
+            position += 1
+
+    if pending:
+        dst.write(pending.pop())
+    shutil.copyfileobj(src, dst)
@@ -0,0 +1,27 @@
+from pathlib import Path
+
+from poetry.utils.env import Env
+
+
+def compile_files(env: Env, files: list[Path]) -> None:
+    """
+    Compile the modules with the interpreter of the environment, in a process pool.
+
+    Compiling is forced, a file patched and written within a second keeps the
+    size and modification time its old bytecode was checked against.
+    """
+    if files:
+        paths = "\n".join(str(file) for file in files)
+        env.run(
+            "python", "-m", "compileall", "-q", "-f", "-j", "0", "-i", "-", input=paths
+        )
+
+
+def invalidate(file: Path) -> None:
+    """
+    Delete the bytecode of a module, of every interpreter.
+    """
+    if file.suffix != ".py":
+        return
+    for pyc in (file.parent / "__pycache__").glob(f"{file.stem}.*.pyc"):
+        pyc.unlink(missing_ok=True)
@@ -0,0 +1,161 @@
+import json
+import os
+from pathlib import Path
+
+from poetry_patches import CACHE
+from poetry_patches.utils import hash_bytes, write_atomic
+
+
+class PatchCache:
+    """
+    A user-level cache for remote patches.
+
+    Patch bodies are stored by their sha256 in `objects/`, the validators of
+    each URL (sha256, ETag, Last-Modified) are stored in `urls/`.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.objects = directory / "objects"
+        self.urls = directory / "urls"
+
+    @classmethod
+    def get(cls):
+        return cls(CACHE / "patches")
+
+    def get_entry(self, url: str) -> dict[str, str | None] | None:
+        path = self.urls / hash_bytes(url.encode())
+        try:
+            entry = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+        if not self.has(entry["sha256"]):
+            return None
+        return entry
+
+    def has(self, sha256: str) -> bool:
+        return (self.objects / sha256).exists()
+
+    def read(self, sha256: str) -> bytes:
+        return (self.objects / sha256).read_bytes()
+
+    def store(
+        self,
+        url: str,
+        content: bytes,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> str:
+        sha256 = hash_bytes(content)
+        if not self.has(sha256):
+            write_atomic(self.objects / sha256, content)
+
+        entry = {"sha256": sha256, "etag": etag, "last_modified": last_modified}
+        write_atomic(self.urls / hash_bytes(url.encode()), json.dumps(entry).encode())
+        return sha256
+
+
+class ParseCache:
+    """
+    A user-level cache for parsed patches, by the sha256 of the patch text.
+
+    A `read_only` cache is only read, e.g. by a dry run.
+    """
+
+    # Bump when the cached form of `Diff` changes.
+    VERSION = 1
+
+    def __init__(self, directory: Path, read_only: bool = False):
+        self.directory = directory
+        self.read_only = read_only
+
+    @classmethod
+    def get(cls):
+        return cls(CACHE / f"parsed-v{cls.VERSION}")
+
+    def read(self, sha256: str) -> list | None:
+        try:
+            return json.loads((self.directory / f"{sha256}.json").read_bytes())
+        except (OSError, ValueError):
+            return None
+
+    def store(self, sha256: str, data: list) -> None:
+        if self.read_only:
+            return
+        text = json.dumps(data, separators=(",", ":"))
+        write_atomic(self.directory / f"{sha256}.json", text.encode())
+
+
+class OutputCache:
+    """
+    A user-level cache for patched files.
+
+    The patched content is stored by the sha256 of the original content and the
+    diff, so the same patches on the same versions are only applied once per
+    machine. The least recently used entries are evicted over `max_size` bytes.
+    A `read_only` cache is only read, without even marking the entries used.
+    """
+
+    MAX_SIZE = 512 * 2**20
+
+    def __init__(
+        self, directory: Path, max_size: int = MAX_SIZE, read_only: bool = False
+    ):
+        self.directory = directory
+        self.max_size = max_size
+        self.read_only = read_only
+
+    @classmethod
+    def get(cls):
+        return cls(CACHE / "outputs")
+
+    @staticmethod
+    def key(content: bytes, diff: str) -> str:
+        return hash_bytes(f"{hash_bytes(content)}:{hash_bytes(diff.encode())}".encode())
+
+    def read(self, key: str) -> bytes | None:
+        path = self.directory / key
+        try:
+            content = path.read_bytes()
+            # The modification time is the last use, `atime` isn't reliable.
+            if not self.read_only:
+                os.utime(path)
+        except OSError:
+            return None
+        return content
+
+    def store(self, key: str, content: bytes) -> None:
+        if self.read_only:
+            return
+        write_atomic(self.directory / key, content)
+
+    def entries(self) -> list[tuple[Path, os.stat_result]]:
+        """
+        Get the entries, the least recently used first.
+        """
+        entries = []
+        for path in self.directory.glob("*"):
+            # Temporary files of a write in progress.
+            if path.name.startswith("."):
+                continue
+            try:
+                entries.append((path, path.stat()))
+            except FileNotFoundError:
+                continue
+        return sorted(entries, key=lambda entry: entry[1].st_mtime_ns)
+
+    def prune(self, max_size: int | None = None) -> int:
+        """
+        Evict the least recently used entries over the size, return their count.
+        """
+        max_size = self.max_size if max_size is None else max_size
+        entries = self.entries()
+        size = sum(stat.st_size for _, stat in entries)
+        evicted = 0
+        for path, stat in entries:
+            if size <= max_size:
+                break
+            path.unlink(missing_ok=True)
+            size -= stat.st_size
+            evicted += 1
+        return evicted
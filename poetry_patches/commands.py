@@ -1,22 +1,453 @@
+import json
+import time
+from collections import Counter
+from collections.abc import Callable, Collection, Iterable
+from pathlib import Path
+from typing import TypeVar
+
+from cleo.helpers import argument, option
 from poetry.console.commands.group_command import GroupCommand
+from poetry.utils.env import Env
 
+from poetry_patches import META
+from poetry_patches.cache import OutputCache, ParseCache, PatchCache
+from poetry_patches.compression import CODECS
+from poetry_patches.distributions import Distributions
+from poetry_patches.envs import get_env
+from poetry_patches.fetcher import Fetcher
 from poetry_patches.patcher import PoetryPatcher
+from poetry_patches.profiler import profiler
 from poetry_patches.state.backup import Backup
+from poetry_patches.state.meta import BACKENDS, migrate
+from poetry_patches.status import get_status
+from poetry_patches.watcher import Watcher, get_changed_packages, get_local_files
+
+T = TypeVar("T")
+
+PROFILE_OPTIONS = [
+    option("profile", None, "Print how long each phase took."),
+    option(
+        "profile-output",
+        None,
+        "Write a Chrome trace of the phases to this file.",
+        flag=False,
+    ),
+]
+
+ENV_OPTION = option(
+    "env",
+    None,
+    "Use this virtualenv or interpreter instead of the project's, can be repeated.",
+    flag=False,
+    multiple=True,
+)
+
+
+def get_envs(paths: list[str]) -> list[tuple[Env, Backup]]:
+    """
+    Get the environments given with `--env`, with their backups.
+    """
+    envs = []
+    for path in paths:
+        env = get_env(Path(path))
+        backup = Backup.for_env(env.path)
+        Backup.init_dir(backup.backups)
+        envs.append((env, backup))
+    return envs
+
+
+class ProfiledCommand(GroupCommand):
+    def profile(self, run: Callable[[], T]) -> T:
+        output = self.option("profile-output")
+        if not self.option("profile") and not output:
+            return run()
 
+        profiler.enable()
+        try:
+            return run()
+        finally:
+            if self.option("profile"):
+                self.line(f"{'phase':<16} {'count':>7} {'total ms':>10} {'max ms':>10}")
+                for name, count, total, longest in profiler.summary():
+                    self.line(
+                        f"{name:<16} {count:>7} {total * 1000:>10.1f}"
+                        f" {longest * 1000:>10.1f}"
+                    )
+            if output:
+                profiler.write_trace(Path(output))
 
-class PatchesApplyCommand(GroupCommand):
+    def find_packages(self, names: list[str], keys: Iterable[str]) -> list[str] | None:
+        """
+        Find the keys of the packages given as arguments, by their normalized names.
+        """
+        normalized = {Distributions.normalize(key): key for key in keys}
+        found = []
+        for name in names:
+            if (key := normalized.get(Distributions.normalize(name))) is None:
+                self.line_error(f"'{name}' has no patches")
+                return None
+            found.append(key)
+        return found
+
+
+class PatchesApplyCommand(ProfiledCommand):
     name = "patches apply"
     description = "Apply the patches."
 
+    arguments = [
+        argument(
+            "packages",
+            "Only apply the patches of these packages.",
+            optional=True,
+            multiple=True,
+        )
+    ]
+    options = [
+        option(
+            "concurrency",
+            None,
+            "The maximum number of patches to download at the same time.",
+            flag=False,
+            default="8",
+        ),
+        option(
+            "timeout",
+            None,
+            "The timeout for downloading a patch, in seconds.",
+            flag=False,
+            default="30",
+        ),
+        option("offline", None, "Only use cached remote patches."),
+        option(
+            "jobs",
+            "j",
+            "The number of files to patch at the same time.",
+            flag=False,
+            default="1",
+        ),
+        option("no-compile", None, "Don't compile the patched modules."),
+        option(
+            "compress-backups",
+            None,
+            "Compress the backups of large files, with zlib or lzma.",
+            flag=False,
+        ),
+        ENV_OPTION,
+        option(
+            "watch",
+            None,
+            "Keep running, reapply the packages whose patches or config change.",
+        ),
+        option(
+            "interval",
+            None,
+            "How often to check for changes in watch mode, in seconds.",
+            flag=False,
+            default="0.5",
+        ),
+        *PROFILE_OPTIONS,
+    ]
+
     def handle(self) -> int:
-        PoetryPatcher(self.poetry, self.io, Backup.get()).apply()
+        compression = self.option("compress-backups")
+        if compression is not None and compression not in CODECS:
+            self.line_error(f"'{compression}' isn't a codec, use zlib or lzma")
+            return 1
+
+        fetcher = Fetcher(
+            max_workers=int(self.option("concurrency")),
+            timeout=float(self.option("timeout")),
+            cache=PatchCache.get(),
+            offline=self.option("offline"),
+        )
+        jobs = int(self.option("jobs"))
+        output_cache = OutputCache.get()
+        backup = Backup.get()
+        backup.compression = compression
+        patcher = PoetryPatcher(
+            self.poetry,
+            self.io,
+            backup,
+            fetcher,
+            jobs,
+            ParseCache.get(),
+            output_cache,
+            compile_bytecode=not self.option("no-compile"),
+        )
+
+        keys = None
+        if names := self.argument("packages"):
+            keys = self.find_packages(names, patcher.poetry_patches_config)
+            if keys is None:
+                return 1
+
+        if paths := self.option("env"):
+            envs = get_envs(paths)
+            for _, env_backup in envs:
+                env_backup.compression = compression
+
+            def apply(keys: Collection[str] | None) -> None:
+                patcher.apply_envs(envs, keys)
+
+        else:
+            Backup.init_dir()
+            apply = patcher.apply
+
+        self.profile(lambda: apply(keys))
+        output_cache.prune()
+
+        if self.option("watch"):
+            self.watch(patcher, apply, float(self.option("interval")))
         return 0
 
+    def watch(
+        self,
+        patcher: PoetryPatcher,
+        apply: Callable[[Collection[str] | None], None],
+        interval: float,
+    ) -> None:
+        """
+        Poll `pyproject.toml` and the local patches, until interrupted.
+        """
+        pyproject = self.poetry.pyproject_path.resolve()
+        config = patcher.poetry_patches_config
+        watcher = Watcher([pyproject, *get_local_files(config)])
+        self.line("Watching for changes, press Ctrl+C to stop.")
+
+        try:
+            while True:
+                time.sleep(interval)
+                if not (changed := watcher.poll()):
+                    continue
+
+                # E.g. a file caught half-saved, it's retried on its next change.
+                try:
+                    new = config
+                    if pyproject in changed:
+                        self.reset_poetry()
+                        patcher.poetry = self.poetry
+                        new = patcher.poetry_patches_config
+                        watcher.watch([pyproject, *get_local_files(new)])
 
-class PatchesRevertCommand(GroupCommand):
+                    if keys := get_changed_packages(config, new, changed):
+                        self.line(f"{', '.join(sorted(keys))} changed, reapplying...")
+                        apply(keys)
+                    config = new
+                except Exception as e:
+                    self.line_error(str(e))
+        except KeyboardInterrupt:
+            pass
+
+
+class PatchesRevertCommand(ProfiledCommand):
     name = "patches revert"
     description = "Revert the patches."
 
+    arguments = [
+        argument(
+            "packages",
+            "Only revert the patches of these packages.",
+            optional=True,
+            multiple=True,
+        )
+    ]
+    options = [
+        option(
+            "jobs",
+            "j",
+            "The number of files to revert at the same time.",
+            flag=False,
+            default="1",
+        ),
+        ENV_OPTION,
+        *PROFILE_OPTIONS,
+    ]
+
+    def handle(self) -> int:
+        jobs = int(self.option("jobs"))
+        if paths := self.option("env"):
+            backups = [backup for _, backup in get_envs(paths)]
+        else:
+            Backup.init_dir()
+            backups = [Backup.get()]
+
+        # The packages to revert in each environment, all of them if `None`.
+        keys = []
+        for backup in backups:
+            if names := self.argument("packages"):
+                if (found := self.find_packages(names, backup.get_packages())) is None:
+                    return 1
+                keys.append(found)
+            else:
+                keys.append(None)
+
+        def revert() -> Counter:
+            reverted = Counter()
+            for backup, found in zip(backups, keys):
+                if found is None:
+                    reverted += backup.revert(jobs=jobs)
+                else:
+                    reverted += backup.revert_packages(found, jobs)
+            return reverted
+
+        reverted = self.profile(revert)
+
+        self.line(
+            f"{reverted['restored']} restored, {reverted['deleted']} deleted,"
+            f" {reverted['skipped']} skipped"
+        )
+        return 0
+
+
+class PatchesCheckCommand(GroupCommand):
+    name = "patches check"
+    description = "Check that the patches apply, without changing any files."
+
+    options = [
+        option("offline", None, "Only use cached remote patches."),
+        option(
+            "jobs",
+            "j",
+            "The number of files to check at the same time.",
+            flag=False,
+            default="1",
+        ),
+        option("json", None, "Output the report as JSON."),
+    ]
+
+    def handle(self) -> int:
+        fetcher = Fetcher(cache=PatchCache.get(), offline=self.option("offline"))
+        jobs = int(self.option("jobs"))
+        # A dry run uses the cached results, but doesn't add to them.
+        parse_cache = ParseCache.get()
+        parse_cache.read_only = True
+        output_cache = OutputCache.get()
+        output_cache.read_only = True
+        report = PoetryPatcher(
+            self.poetry, self.io, Backup.get(), fetcher, jobs, parse_cache, output_cache
+        ).check()
+
+        if self.option("json"):
+            self.line(json.dumps(report, indent=4))
+        else:
+            for key, value in report.items():
+                self.line(f"{key}: {value['status']}")
+                for error in value["errors"]:
+                    self.line(f"    {error}")
+
+        failed = any(value["status"] == "failed" for value in report.values())
+        return 1 if failed else 0
+
+
+class PatchesCacheCommand(GroupCommand):
+    name = "patches cache"
+    description = "Show the size of the patched files cache, or prune it."
+
+    options = [
+        option(
+            "prune",
+            None,
+            "Evict the least recently used entries over the maximum size.",
+        ),
+        option(
+            "max-size",
+            None,
+            "The maximum size to prune to, in MiB.",
+            flag=False,
+            default=str(OutputCache.MAX_SIZE // 2**20),
+        ),
+        option("clear", None, "Remove every entry."),
+    ]
+
+    def handle(self) -> int:
+        cache = OutputCache.get()
+
+        if self.option("clear"):
+            self.line(f"{cache.prune(0)} evicted")
+        elif self.option("prune"):
+            self.line(f"{cache.prune(int(self.option('max-size')) * 2**20)} evicted")
+
+        entries = cache.entries()
+        size = sum(stat.st_size for _, stat in entries) / 2**20
+        self.line(f"{cache.directory}: {len(entries)} entries, {size:.1f} MiB")
+        return 0
+
+
+class PatchesStatusCommand(GroupCommand):
+    name = "patches status"
+    description = "Check that the patched files still have the patched content."
+
+    options = [option("json", None, "Output the status of every file as JSON.")]
+
     def handle(self) -> int:
-        Backup.get().revert()
+        report = {
+            key: get_status(package)
+            for key, package in Backup.get().get_packages().items()
+        }
+        counts = Counter(
+            status for files in report.values() for status in files.values()
+        )
+
+        if self.option("json"):
+            self.line(json.dumps(report, indent=4))
+        else:
+            for key, files in report.items():
+                for file, status in files.items():
+                    if status != "intact":
+                        self.line(f"{key}: {file} {status}")
+            self.line(
+                f"{counts['intact']} intact, {counts['drifted']} drifted,"
+                f" {counts['missing']} missing"
+            )
+
+        return 1 if counts["drifted"] or counts["missing"] else 0
+
+
+class PatchesMigrateCommand(GroupCommand):
+    name = "patches migrate"
+    description = "Move the state of the patched files to another backend."
+
+    arguments = [argument("backend", "The backend to move to, json or sqlite.")]
+    options = [ENV_OPTION]
+
+    def handle(self) -> int:
+        backend = self.argument("backend")
+        if backend not in BACKENDS:
+            self.line_error(f"'{backend}' isn't a backend, use json or sqlite")
+            return 1
+
+        if paths := self.option("env"):
+            backups = [backup for _, backup in get_envs(paths)]
+        else:
+            Backup.init_dir()
+            backups = [Backup.get()]
+
+        for backup in backups:
+            meta = backup.backups.with_name(META.name)
+            if migrate(meta, backend):
+                self.line(f"{meta.parent}: moved to {backend}")
+            else:
+                self.line(f"{meta.parent}: already on {backend}")
+        return 0
+
+
+class PatchesGcCommand(GroupCommand):
+    name = "patches gc"
+    description = "Delete the backups that no patched file refers to."
+
+    options = [ENV_OPTION]
+
+    def handle(self) -> int:
+        if paths := self.option("env"):
+            backups = [backup for _, backup in get_envs(paths)]
+        else:
+            Backup.init_dir()
+            backups = [Backup.get()]
+
+        deleted = size = 0
+        for backup in backups:
+            count, freed = backup.gc()
+            deleted += count
+            size += freed
+        self.line(f"{deleted} deleted, {size / 2**20:.1f} MiB freed")
         return 0
@@ -0,0 +1,50 @@
+import gzip
+import lzma
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import BinaryIO
+
+# The codecs for backups, by the suffix of the compressed file. zlib is
+# written in the gzip format, which wraps its deflate stream in a file API.
+CODECS = {"zlib": ".gz", "lzma": ".xz"}
+OPENERS = {
+    ".gz": lambda path, mode: gzip.open(path, mode, compresslevel=6),
+    ".xz": lzma.open,
+}
+
+CHUNK_SIZE = 2**20
+
+
+def compress_file(src: Path, dst: Path) -> None:
+    """
+    Compress a file atomically, with the codec of the suffix of `dst`.
+    """
+    fd, tmp = tempfile.mkstemp(dir=dst.parent, prefix=".tmp_")
+    os.close(fd)
+    try:
+        with src.open("rb") as s, OPENERS[dst.suffix](tmp, "wb") as d:
+            shutil.copyfileobj(s, d, CHUNK_SIZE)
+        os.replace(tmp, dst)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def is_compressed(file: Path) -> bool:
+    return file.suffix in OPENERS
+
+
+def open_backup(file: Path) -> BinaryIO:
+    """
+    Open a backup for reading, decompressed as a stream if it's compressed.
+    """
+    if is_compressed(file):
+        return OPENERS[file.suffix](file, "rb")
+    return file.open("rb")
+
+
+def read_backup(file: Path) -> bytes:
+    with open_backup(file) as f:
+        return f.read()
@@ -0,0 +1,122 @@
+import json
+import re
+from importlib import metadata
+from pathlib import Path
+
+from poetry_patches import DISTRIBUTIONS
+
+
+class Distributions:
+    """
+    An index of the distributions in the site-packages of an environment.
+
+    The index is built with a single scan and maps normalized names to the
+    version and the roots of a distribution. It's cached in
+    `.poetry-patches/distributions.json` until a site-packages directory changes.
+    """
+
+    def __init__(self, entries: dict[str, dict]):
+        self.entries = entries
+
+    @classmethod
+    def get(cls, paths: list[Path], cache: Path | None = DISTRIBUTIONS):
+        mtimes = cls.get_mtimes(paths)
+
+        if cache is not None:
+            try:
+                data = json.loads(cache.read_text())
+            except (OSError, ValueError):
+                data = None
+            if data is not None and data["mtimes"] == mtimes:
+                return cls(data["distributions"])
+
+        distributions = cls.build(paths)
+
+        if cache is not None and cache.parent.exists():
+            data = {"mtimes": mtimes, "distributions": distributions.entries}
+            cache.write_text(json.dumps(data))
+
+        return distributions
+
+    @classmethod
+    def build(cls, paths: list[Path]):
+        entries = {}
+        for dist in metadata.distributions(path=[str(path) for path in paths]):
+            name = cls.normalize(dist.metadata["Name"] or "")
+            # The first one wins, like on `sys.path`.
+            if name and name not in entries:
+                roots = [str(Path(dist.locate_file("")).resolve())]
+                roots.extend(
+                    root for root in cls.get_pth_roots(dist) if root not in roots
+                )
+                entries[name] = {
+                    "version": dist.version,
+                    "roots": roots,
+                    "record": cls.get_record(dist),
+                }
+        return cls(entries)
+
+    @staticmethod
+    def get_record(dist: metadata.Distribution) -> int | None:
+        """
+        Get the modification time of the `RECORD` of a distribution.
+
+        The installer rewrites it whenever a distribution is (re)installed.
+        """
+        for file in dist.files or []:
+            if file.name == "RECORD":
+                try:
+                    return Path(dist.locate_file(file)).stat().st_mtime_ns
+                except OSError:
+                    return None
+        return None
+
+    @staticmethod
+    def get_mtimes(paths: list[Path]) -> dict[str, int | None]:
+        mtimes = {}
+        for path in paths:
+            try:
+                mtimes[str(path)] = path.stat().st_mtime_ns
+            except FileNotFoundError:
+                mtimes[str(path)] = None
+        return mtimes
+
+    @staticmethod
+    def get_pth_roots(dist: metadata.Distribution) -> list[str]:
+        """
+        Get the directories added to `sys.path` by the `.pth` files of a distribution.
+        """
+        roots = []
+        for file in dist.files or []:
+            if file.suffix != ".pth":
+                continue
+            path = Path(dist.locate_file(file))
+            try:
+                lines = path.read_text().splitlines()
+            except (OSError, UnicodeDecodeError):
+                continue
+            for line in lines:
+                line = line.strip()
+                if not line or line.startswith(("#", "import ", "import\t")):
+                    continue
+                root = (path.parent / line).resolve()
+                if root.is_dir():
+                    roots.append(str(root))
+        return roots
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        return re.sub(r"[-_.]+", "-", name).lower()
+
+    def find(self, name: str) -> tuple[str, list[Path]] | None:
+        """
+        Find the version and the roots of a distribution.
+        """
+        if entry := self.entries.get(self.normalize(name)):
+            return entry["version"], [Path(root) for root in entry["roots"]]
+        return None
+
+    def record(self, name: str) -> int | None:
+        if entry := self.entries.get(self.normalize(name)):
+            return entry.get("record")
+        return None
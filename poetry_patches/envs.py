@@ -0,0 +1,20 @@
+import subprocess
+from pathlib import Path
+
+from poetry.utils.env import Env, SystemEnv, VirtualEnv
+
+PREFIXES = "import sys; print(sys.prefix); print(sys.base_prefix)"
+
+
+def get_env(path: Path) -> Env:
+    """
+    Get the environment of a virtualenv directory or of an interpreter.
+    """
+    if path.is_dir():
+        return VirtualEnv(path.resolve())
+
+    output = subprocess.check_output([str(path), "-c", PREFIXES], text=True)
+    prefix, base_prefix = output.splitlines()
+    if prefix == base_prefix:
+        return SystemEnv(Path(prefix))
+    return VirtualEnv(Path(prefix))
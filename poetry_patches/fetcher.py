@@ -0,0 +1,125 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from poetry_patches.cache import PatchCache
+from poetry_patches.profiler import profiler
+from poetry_patches.utils import hash_bytes
+
+
+class Fetcher:
+    """
+    A class for reading patch texts from local paths and remote URIs.
+
+    Remote URIs are downloaded through a shared session, so connections to the
+    same host are pooled and reused.
+
+    A URI may pin its content with a `#sha256=<hex>` fragment.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        timeout: float = 30.0,
+        cache: PatchCache | None = None,
+        offline: bool = False,
+    ):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cache = cache
+        self.offline = offline
+
+    @cached_property
+    def session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.max_workers, pool_maxsize=self.max_workers
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def fetch(self, uri: str) -> str:
+        location, sha256 = self.split_uri(uri)
+
+        with profiler.phase("read", uri=uri):
+            if self.is_remote(location):
+                content = self.download(location, sha256)
+            else:
+                content = Path(location).read_bytes()
+
+        if sha256 is not None and hash_bytes(content) != sha256:
+            raise ValueError(f"'{uri}' can't fetch, sha256 doesn't match")
+
+        return content.decode()
+
+    def download(self, url: str, sha256: str | None) -> bytes:
+        if self.cache is None:
+            if self.offline:
+                raise ValueError(f"'{url}' can't fetch, offline")
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            return response.content
+
+        # A pinned patch is content addressed, a cache hit is always valid.
+        if sha256 is not None and self.cache.has(sha256):
+            return self.cache.read(sha256)
+
+        entry = self.cache.get_entry(url)
+        if self.offline:
+            if entry is None:
+                raise ValueError(f"'{url}' can't fetch, offline and not cached")
+            return self.cache.read(entry["sha256"])
+
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and entry is not None:
+            return self.cache.read(entry["sha256"])
+
+        response.raise_for_status()
+        self.cache.store(
+            url,
+            response.content,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        return response.content
+
+    def fetch_all(self, uris: list[str]) -> dict[str, str]:
+        """
+        Fetch every URI once, downloading the remote ones concurrently.
+        """
+        uris = list(dict.fromkeys(uris))
+        remote = [uri for uri in uris if self.is_remote(uri)]
+        texts = {}
+
+        if remote:
+            max_workers = max(1, min(self.max_workers, len(remote)))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                texts.update(zip(remote, executor.map(self.fetch, remote)))
+
+        for uri in uris:
+            if uri not in texts:
+                texts[uri] = self.fetch(uri)
+
+        return {uri: texts[uri] for uri in uris}
+
+    @staticmethod
+    def split_uri(uri: str) -> tuple[str, str | None]:
+        location, _, fragment = uri.partition("#")
+        if fragment.startswith("sha256="):
+            return location, fragment.removeprefix("sha256=").lower()
+        return uri, None
+
+    @staticmethod
+    def is_remote(uri: str) -> bool:
+        return uri.startswith("http://") or uri.startswith("https://")
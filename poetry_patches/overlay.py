@@ -0,0 +1,71 @@
+from pathlib import Path
+
+from poetry_patches.compression import read_backup
+
+
+class Overlay:
+    """
+    An in-memory copy of the files touched by a run.
+
+    Reads fall through to the original content of a file: its backup if it's
+    patched already, otherwise the file on disk. Nothing is written until it's
+    flushed, a dry run never flushes.
+    """
+
+    def __init__(self, originals: dict[str, str | None] | None = None):
+        self.originals = originals or {}
+        self.files: dict[str, bytes | None] = {}
+
+    @staticmethod
+    def key(file: Path) -> str:
+        return str(file.resolve())
+
+    def exists(self, file: Path) -> bool:
+        key = self.key(file)
+        if key in self.files:
+            return self.files[key] is not None
+        if key in self.originals:
+            # Files created by a patch have no backup.
+            return self.originals[key] is not None
+        return file.exists()
+
+    def read(self, file: Path) -> bytes:
+        key = self.key(file)
+        if key in self.files:
+            content = self.files[key]
+        elif key in self.originals:
+            backup = self.originals[key]
+            content = None if backup is None else read_backup(Path(backup))
+        else:
+            return file.read_bytes()
+
+        if content is None:
+            raise FileNotFoundError(file)
+        return content
+
+    def write(self, file: Path, content: bytes) -> None:
+        self.files[self.key(file)] = content
+
+    def delete(self, file: Path) -> None:
+        self.files[self.key(file)] = None
+
+    def rename(self, old: Path, new: Path) -> None:
+        self.write(new, self.read(old))
+        self.delete(old)
+
+    def has(self, file: Path) -> bool:
+        return self.key(file) in self.files
+
+    def pop(self, file: Path) -> bytes | None:
+        return self.files.pop(self.key(file), None)
+
+    def flush(self) -> None:
+        """
+        Write every changed file once.
+        """
+        for key, content in self.files.items():
+            if content is None:
+                Path(key).unlink(missing_ok=True)
+            else:
+                Path(key).write_bytes(content)
+        self.files.clear()
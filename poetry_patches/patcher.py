@@ -1,47 +1,102 @@
 import os
+import shutil
+import tempfile
+import threading
+from collections.abc import Collection
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 
-import requests
 import whatthepatch
+from cleo.io.buffered_io import BufferedIO
 from cleo.io.io import IO
 from cleo.io.outputs.output import Verbosity
 from poetry.poetry import Poetry
-from poetry.utils.env import EnvManager
+from poetry.utils.env import Env, EnvCommandError, EnvManager
 from whatthepatch.exceptions import WhatThePatchException
 
+from poetry_patches import DISTRIBUTIONS
+from poetry_patches.applier import Hunk, apply_hunks, apply_hunks_stream, parse_hunks
+from poetry_patches.bytecode import compile_files, invalidate
+from poetry_patches.cache import OutputCache, ParseCache
+from poetry_patches.distributions import Distributions
+from poetry_patches.fetcher import Fetcher
+from poetry_patches.overlay import Overlay
+from poetry_patches.profiler import profiler
+from poetry_patches.scheduler import Scheduler
 from poetry_patches.state.backup import Backup
+from poetry_patches.status import get_stat, get_status
+from poetry_patches.utils import hash_bytes, hash_file
+
+# Files from this size are patched line by line, instead of in memory.
+STREAM_SIZE = 32 * 2**20
 
 
 class Diff:
+    """
+    A parsed diff of a single file.
+
+    The header and the changes are kept as plain tuples, the form they're
+    cached in, and are only decoded to `whatthepatch` objects when accessed.
+    """
+
+    __slots__ = ("header_data", "changes_data", "text", "_header", "_changes")
+
     def __init__(
         self,
-        header: whatthepatch.patch.header,
-        changes: list[whatthepatch.patch.Change],
+        header: tuple | None,
+        changes: list[tuple] | None,
         text: str,
     ):
-        self.header = header
-        self.changes = changes
+        self.header_data = header
+        self.changes_data = changes
         self.text = text
+        self._header = None
+        self._changes = None
 
     @classmethod
     def from_diffobj(cls, diffobj: whatthepatch.patch.diffobj):
-        return cls(header=diffobj.header, changes=diffobj.changes, text=diffobj.text)
+        header = tuple(diffobj.header) if diffobj.header else None
+        changes = [tuple(change) for change in diffobj.changes or []]
+        return cls(header=header, changes=changes, text=diffobj.text)
 
     def to_diffobj(self) -> whatthepatch.patch.diffobj:
         return whatthepatch.patch.diffobj(
             header=self.header, changes=self.changes, text=self.text
         )
 
+    @classmethod
+    def from_data(cls, data: list):
+        header, changes, text = data
+        return cls(header=tuple(header) if header else None, changes=changes, text=text)
+
+    def to_data(self) -> list:
+        return [self.header_data, self.changes_data, self.text]
+
+    @property
+    def header(self) -> whatthepatch.patch.header | None:
+        if self._header is None and self.header_data is not None:
+            self._header = whatthepatch.patch.header(*self.header_data)
+        return self._header
+
+    @property
+    def changes(self) -> list[whatthepatch.patch.Change]:
+        if self._changes is None:
+            changes = self.changes_data or []
+            self._changes = [whatthepatch.patch.Change(*change) for change in changes]
+        return self._changes
+
     @property
     def old_path(self) -> str:
-        old_path = self.header.old_path
+        # The fields of `whatthepatch.patch.header`.
+        old_path = self.header_data[1]
         if old_path.startswith("a/"):
             old_path = old_path[2:]
         return old_path
 
     @property
     def new_path(self) -> str:
-        new_path = self.header.new_path
+        new_path = self.header_data[3]
         if new_path.startswith("b/"):
             new_path = new_path[2:]
         return new_path
@@ -51,18 +106,54 @@ class Diff:
 
 
 class PoetryPatcher:
-    def __init__(self, poetry: Poetry, io: IO, backup: Backup):
+    def __init__(
+        self,
+        poetry: Poetry,
+        io: IO,
+        backup: Backup,
+        fetcher: Fetcher | None = None,
+        jobs: int = 1,
+        parse_cache: ParseCache | None = None,
+        output_cache: OutputCache | None = None,
+        env: Env | None = None,
+        compile_bytecode: bool = True,
+    ):
         self.poetry = poetry
         self.io = io
         self.backup = backup
+        self.fetcher = fetcher or Fetcher()
+        self.jobs = jobs
+        self.parse_cache = parse_cache
+        self.output_cache = output_cache
+        self.env = env
+        self.compile_bytecode = compile_bytecode
+        self.stream_size = STREAM_SIZE
+        self.distributions_cache: Path | None = DISTRIBUTIONS
+        self.diffs: dict[str, list[Diff]] = {}
+        self.overlay: Overlay | None = None
+        self.buffer: Overlay | None = None
+        self.texts: dict[str, str] = {}
         self.errors = 0
+        self.lock = threading.Lock()
+        self.local = threading.local()
 
     def debug(self, message: str) -> None:
-        self.io.write_line(message, Verbosity.DEBUG)
+        self.write(message, error=False)
 
     def error(self, message: str) -> None:
-        self.errors += 1
-        self.io.write_error_line(message)
+        with self.lock:
+            self.errors += 1
+        self.write(message, error=True)
+
+    def write(self, message: str, error: bool) -> None:
+        # Messages of a diff are buffered, so they're written in a deterministic order.
+        messages = getattr(self.local, "messages", None)
+        if messages is not None:
+            messages.append((message, error))
+        elif error:
+            self.io.write_error_line(message)
+        else:
+            self.io.write_line(message, Verbosity.DEBUG)
 
     @property
     def poetry_patches_config(self) -> dict[str, list[str]]:
@@ -70,25 +161,432 @@ class PoetryPatcher:
         config = tool.get("poetry-patches", {})
         return config
 
-    def apply(self) -> None:
-        self.backup.revert()
-        env = EnvManager(self.poetry, self.io).get()
+    @property
+    def patch_uris(self) -> list[str]:
+        return [uri for uris in self.poetry_patches_config.values() for uri in uris]
+
+    def prefetch(self, uris: list[str] | None = None) -> None:
+        """
+        Fetch every configured patch before applying any of them.
+        """
+        # The patches may have changed since the last run, e.g. in watch mode.
+        self.diffs = {}
+        with profiler.phase("prefetch"):
+            self.texts = self.fetcher.fetch_all(
+                self.patch_uris if uris is None else uris
+            )
+
+    def get_distributions(self) -> Distributions:
+        with profiler.phase("env"):
+            self.env = self.env or EnvManager(self.poetry, self.io).get()
+        with profiler.phase("distributions"):
+            return Distributions.get(
+                self.env.site_packages.candidates, self.distributions_cache
+            )
+
+    def apply(self, keys: Collection[str] | None = None) -> None:
+        """
+        Apply the patches, or only the patches of the given packages.
+        """
+        self.prefetch_keys(keys)
+        distributions = self.get_distributions()
+        self.apply_distributions(distributions, self.poetry_patches_config, keys)
+
+    def apply_envs(
+        self, envs: list[tuple[Env, Backup]], keys: Collection[str] | None = None
+    ) -> None:
+        """
+        Apply the patches to several environments in parallel, each with its own
+        backups. The patches are fetched and parsed once.
+        """
+        self.prefetch_keys(keys)
+        # Parsed before the environments start, they only read `self.diffs`.
+        for uri in self.texts:
+            self.parse_patch(uri)
+        patchers = [self.for_env(env, backup) for env, backup in envs]
+
+        def apply(patcher: PoetryPatcher) -> Exception | None:
+            try:
+                distributions = patcher.get_distributions()
+                config = patcher.poetry_patches_config
+                patcher.apply_distributions(distributions, config, keys)
+            except Exception as e:
+                return e
+            return None
+
+        with ThreadPoolExecutor(max(len(patchers), 1)) as executor:
+            failures = list(executor.map(apply, patchers))
+
+        # The output of each environment is written in order, failed or not.
+        for patcher, failure in zip(patchers, failures):
+            if failure is None:
+                self.io.write_line(f"'{patcher.env.path}' patched", Verbosity.VERBOSE)
+            self.io.write(patcher.io.fetch_output())
+            self.io.write_error(patcher.io.fetch_error())
+            self.errors += patcher.errors
+            if failure is not None:
+                self.error(f"'{patcher.env.path}' can't patch, {failure}")
+
+        if failed := [failure for failure in failures if failure is not None]:
+            raise RuntimeError(
+                f"{len(failed)} of {len(patchers)} environments can't be patched"
+            ) from failed[0]
+
+    def for_env(self, env: Env, backup: Backup) -> "PoetryPatcher":
+        io = BufferedIO(decorated=self.io.is_decorated())
+        io.set_verbosity(self.io.output.verbosity)
+        patcher = PoetryPatcher(
+            self.poetry,
+            io,
+            backup,
+            self.fetcher,
+            self.jobs,
+            self.parse_cache,
+            self.output_cache,
+            env,
+            self.compile_bytecode,
+        )
+        patcher.stream_size = self.stream_size
+        patcher.distributions_cache = backup.meta.meta.with_name("distributions.json")
+        patcher.texts = self.texts
+        patcher.diffs = self.diffs
+        return patcher
+
+    def prefetch_keys(self, keys: Collection[str] | None) -> None:
+        if keys is None:
+            self.prefetch()
+        else:
+            config = self.poetry_patches_config
+            self.prefetch([uri for key in keys for uri in config.get(key, [])])
+
+    def reapply(self) -> None:
+        """
+        Apply the patches of the packages installed since the last run only.
+        """
+        distributions = self.get_distributions()
+        config = self.poetry_patches_config
+        packages = self.backup.get_packages()
+        installed = {key for key in config if distributions.find(key) is not None}
+        reinstalled = {
+            key: config[key]
+            for key in installed
+            if key not in packages
+            or distributions.record(key) is None
+            or packages[key].get("record") != distributions.record(key)
+        }
+        removed = packages.keys() - config.keys()
+        # Patched, then uninstalled, they're forgotten without fetching anything.
+        uninstalled = (packages.keys() & config.keys()) - installed
+        if not reinstalled and not removed and not uninstalled:
+            return
+
+        self.prefetch([uri for uris in reinstalled.values() for uri in uris])
+        self.apply_distributions(
+            distributions, config, reinstalled.keys() | removed | uninstalled
+        )
+
+    def apply_distributions(
+        self,
+        distributions: Distributions,
+        config: dict[str, list[str]],
+        keys: Collection[str] | None = None,
+    ) -> None:
+        with self.backup.transaction():
+            self.revert_stale(config, keys)
+
+            packages = []
+            records = {}
+            for key, value in config.items():
+                if keys is not None and key not in keys:
+                    continue
+                if dist := distributions.find(key):
+                    version, roots = dist
+                    packages.append((key, roots, version, value))
+                    records[key] = distributions.record(key)
+                else:
+                    # Uninstalled, restoring its backups would resurrect its files.
+                    self.forget_package(key)
+
+            files = self.apply_packages(packages, records)
+
+        self.compile_modules(files)
+
+    def compile_modules(self, files: list[Path]) -> None:
+        """
+        Recompile the patched modules, or drop their stale bytecode.
+        """
+        modules = [file for file in files if file.suffix == ".py"]
+        if not self.compile_bytecode or self.env is None:
+            for module in modules:
+                invalidate(module)
+            return
 
+        with profiler.phase("compile"):
+            try:
+                compile_files(self.env, modules)
+            except EnvCommandError as e:
+                self.error(f"can't compile the patched modules: {e}")
+
+    def revert_stale(
+        self, config: dict[str, list[str]], keys: Collection[str] | None = None
+    ) -> None:
+        """
+        Revert the packages that are no longer patched, out of the given ones.
+        """
+        packages = self.backup.get_packages()
+
+        if keys is None:
+            files = {f for package in packages.values() for f in package["files"]}
+            # Backups without a package come from an older version, revert everything.
+            if any(key not in files for key in self.backup.meta.get_backups()):
+                self.backup.revert()
+                return
+            keys = list(packages)
+
+        for key in [key for key in keys if key in packages]:
+            if key not in config or self.is_legacy(packages[key]):
+                self.revert_package(key)
+
+    @staticmethod
+    def is_legacy(package: dict) -> bool:
+        """
+        Whether a package was recorded without the files of each patch.
+        """
+        return any(not isinstance(patch, dict) for patch in package["patches"].values())
+
+    def apply_package(
+        self, key: str, target_dir: Path, version: str, patch_uris: list[str]
+    ) -> None:
+        self.apply_packages([(key, [target_dir], version, patch_uris)])
+
+    def apply_packages(
+        self,
+        packages: list[tuple[str, list[Path], str, list[str]]],
+        records: dict[str, int | None] | None = None,
+    ) -> list[Path]:
+        """
+        Apply the patches of the packages whose fingerprint changed.
+
+        Return the patched files.
+        """
+        records = records or {}
+        pending = []
+        for key, roots, version, patch_uris in packages:
+            patches = {uri: hash_bytes(self.read(uri).encode()) for uri in patch_uris}
+
+            if package := self.backup.get_package(key):
+                if self.is_reinstalled(package, records.get(key)):
+                    self.forget_package(key)
+                else:
+                    with profiler.phase("fingerprint", package=key):
+                        applied = self.is_applied(package, version, patches)
+                    if applied:
+                        self.debug(f"'{key}' unchanged, skipping")
+                        continue
+                    self.revert_package(key)
+
+            tasks = self.get_tasks(roots, patch_uris)
+            pending.append((key, version, patches, tasks))
+
+        results = iter(self.run_tasks([t for *_, tasks in pending for t in tasks]))
+
+        patched = []
+        for key, version, patches, tasks in pending:
+            files = {}
+            stats = {}
+            patch_files = {
+                uri: {"sha256": value, "files": []} for uri, value in patches.items()
+            }
+            for patch_uri, target_dir, diff in tasks:
+                for file in self.get_files(target_dir, diff):
+                    file = file.resolve()
+                    patch_files[patch_uri]["files"].append(str(file))
+                    stats[str(file)] = get_stat(file)
+                    files[str(file)] = hash_file(file)
+                    if files[str(file)] is not None:
+                        patched.append(file)
+
+            messages = [next(results) for _ in tasks]
+            package = {
+                "version": version,
+                "record": records.get(key),
+                "patches": patch_files,
+                "files": files,
+                "stats": stats,
+                "complete": not any(error for task in messages for _, error in task),
+            }
+            self.backup.set_package(key, package)
+
+        return patched
+
+    def check(self) -> dict[str, dict]:
+        """
+        Apply the patches to an in-memory copy of the files, without any backups
+        or disk writes, and report the errors of each package.
+        """
+        self.prefetch()
+        distributions = self.get_distributions()
+        self.overlay = Overlay(self.backup.get_backups())
+
+        report = {}
+        pending = []
         for key, value in self.poetry_patches_config.items():
-            if dist := env.site_packages.find_distribution(key):
-                self.apply_patches(dist._path.parent, value)
+            report[key] = {"status": "skipped", "errors": []}
+            if dist := distributions.find(key):
+                _, roots = dist
+                pending.append((key, self.get_tasks(roots, value)))
+
+        tasks = [task for _, tasks in pending for task in tasks]
+        try:
+            results = iter(self.run_tasks(tasks, write=False))
+        finally:
+            self.overlay = None
+
+        for key, tasks in pending:
+            errors = [m for _ in tasks for m, error in next(results) if error]
+            report[key] = {"status": "failed" if errors else "ok", "errors": errors}
+
+        return report
 
-    def apply_patches(self, target_dir: Path, patch_uris: list[str]) -> None:
+    def get_tasks(
+        self, roots: list[Path], patch_uris: list[str]
+    ) -> list[tuple[str, Path, Diff]]:
+        tasks = []
         for patch_uri in patch_uris:
-            self.apply_patch(target_dir, patch_uri)
+            patch_tasks = self.parse_patches(roots[0], [patch_uri])
+            target_dir = self.find_root(roots, patch_tasks)
+            tasks.extend((uri, target_dir, diff) for uri, _, diff in patch_tasks)
+        return tasks
 
-    def apply_patch(self, target_dir: Path, patch_uri: str) -> None:
-        self.debug(f"'{patch_uri}' applying...")
+    @staticmethod
+    def find_root(roots: list[Path], tasks: list[tuple[str, Path, Diff]]) -> Path:
+        """
+        Find the root of a distribution that has the files a patch changes.
+        """
+        old_paths = [diff.old_path for _, _, diff in tasks]
+        old_paths = [path for path in old_paths if not PoetryPatcher.is_empty(path)]
+        for root in roots:
+            if all((root / path).exists() for path in old_paths):
+                return root
+        return roots[0]
+
+    @staticmethod
+    def is_applied(package: dict, version: str, patches: dict[str, str]) -> bool:
+        return (
+            package["complete"]
+            and package["version"] == version
+            and {uri: patch["sha256"] for uri, patch in package["patches"].items()}
+            == patches
+            and all(status == "intact" for status in get_status(package).values())
+        )
+
+    @staticmethod
+    def is_reinstalled(package: dict, record: int | None) -> bool:
+        """
+        Whether the installer overwrote the patched files since they were patched.
+        """
+        return None not in (package.get("record"), record) and (
+            package["record"] != record
+        )
+
+    def forget_package(self, key: str) -> None:
+        if package := self.backup.get_package(key):
+            self.backup.forget(package["files"])
+            self.backup.set_package(key, None)
+            self.debug(f"'{key}' forgotten")
+
+    def revert_package(self, key: str) -> None:
+        with profiler.phase("revert", package=key):
+            reverted = self.backup.revert_package(key, self.jobs)
+        if reverted is not None:
+            self.debug(f"'{key}' reverted")
+
+    def apply_patches(self, target_dir: Path, patch_uris: list[str]) -> list[Diff]:
+        tasks = self.parse_patches(target_dir, patch_uris)
+        self.run_tasks(tasks)
+        return [diff for _, _, diff in tasks]
+
+    def apply_patch(self, target_dir: Path, patch_uri: str) -> list[Diff]:
+        return self.apply_patches(target_dir, [patch_uri])
+
+    def parse_patches(
+        self, target_dir: Path, patch_uris: list[str]
+    ) -> list[tuple[str, Path, Diff]]:
+        tasks = []
+        for patch_uri in patch_uris:
+            for diff in self.parse_patch(patch_uri):
+                tasks.append((patch_uri, target_dir, diff))
+        return tasks
+
+    def parse_patch(self, patch_uri: str) -> list[Diff]:
+        # Shared by the environments of a run.
+        if (diffs := self.diffs.get(patch_uri)) is None:
+            diffs = self.diffs[patch_uri] = self.load_patch(patch_uri)
+        return diffs
+
+    def load_patch(self, patch_uri: str) -> list[Diff]:
         text = self.read(patch_uri)
-        diffs = [Diff.from_diffobj(diff) for diff in whatthepatch.parse_patch(text)]
+        with profiler.phase("parse", patch=patch_uri):
+            if self.parse_cache is None:
+                diffs = whatthepatch.parse_patch(text)
+                return [Diff.from_diffobj(diff) for diff in diffs]
+
+            key = hash_bytes(text.encode())
+            if (data := self.parse_cache.read(key)) is not None:
+                return [Diff.from_data(diff) for diff in data]
+
+            diffs = [Diff.from_diffobj(diff) for diff in whatthepatch.parse_patch(text)]
+            self.parse_cache.store(key, [diff.to_data() for diff in diffs])
+            return diffs
+
+    def run_tasks(
+        self, tasks: list[tuple[str, Path, Diff]], write: bool = True
+    ) -> list[list[tuple[str, bool]]]:
+        """
+        Apply the diffs on a worker pool, diffs touching the same file run in order.
+
+        Return the messages of each diff, as `(message, error)` tuples.
+        """
+        # Updates are buffered, a file changed by several diffs is written once.
+        self.buffer = Overlay() if self.overlay is None else None
+        try:
+            results = Scheduler(self.jobs).run(
+                [
+                    (
+                        partial(self.run_task, target_dir, diff),
+                        self.get_files(target_dir, diff),
+                    )
+                    for _, target_dir, diff in tasks
+                ]
+            )
+        finally:
+            if self.buffer is not None:
+                with profiler.phase("flush"):
+                    self.buffer.flush()
+                self.buffer = None
+
+        if write:
+            patch_uri = None
+            for task, messages in zip(tasks, results):
+                if task[0] != patch_uri:
+                    patch_uri = task[0]
+                    self.debug(f"'{patch_uri}' applying...")
+                for message, error in messages:
+                    self.write(message, error)
+        return results
+
+    def run_task(self, target_dir: Path, diff: Diff) -> list[tuple[str, bool]]:
+        self.local.messages = messages = []
+        try:
+            with profiler.phase("diff", file=str(target_dir / diff.new_path)):
+                self.apply_diff(target_dir, diff)
+        finally:
+            self.local.messages = None
+        return messages
 
-        for diff in diffs:
-            self.apply_diff(target_dir, diff)
+    def get_files(self, target_dir: Path, diff: Diff) -> list[Path]:
+        paths = dict.fromkeys((diff.old_path, diff.new_path))
+        return [target_dir / path for path in paths if not self.is_empty(path)]
 
     def apply_diff(self, target_dir: Path, diff: Diff) -> None:
         old_path, new_path = diff.old_path, diff.new_path
@@ -106,59 +604,144 @@ class PoetryPatcher:
             self.update(new_file, diff)
 
     def delete(self, file: Path) -> None:
-        if not file.exists():
+        if not self.exists(file):
             self.error(f"'{file}' can't delete, doesn't exist")
             return
 
-        self.backup.edit_or_delete(file)
-        file.unlink()
+        if self.overlay is not None:
+            self.overlay.delete(file)
+        else:
+            self.backup.edit_or_delete(file)
+            file.unlink()
+            if self.buffer is not None:
+                self.buffer.pop(file)
         self.debug(f"{file} deleted")
 
     def rename(self, old: Path, new: Path) -> None:
-        if not old.exists():
+        if not self.exists(old):
             self.error(f"'{old}' -> '{new}' can't rename, '{old}' doesn't exist")
             return
-        if new.exists():
+        if self.exists(new):
             self.error(f"'{old}' -> '{new}' can't rename, '{new}' already exists")
             return
 
-        self.backup.create_or_rename(new)
-        os.rename(old, new)
+        if self.overlay is not None:
+            self.overlay.rename(old, new)
+        else:
+            # The source is backed up too, to restore it and to check the
+            # patch again on a patched tree.
+            self.backup.edit_or_delete(old)
+            self.backup.create_or_rename(new)
+            os.rename(old, new)
+            if (
+                self.buffer is not None
+                and (content := self.buffer.pop(old)) is not None
+            ):
+                self.buffer.write(new, content)
         self.debug(f"{old} -> {new}")
 
     def create(self, file: Path, diff: Diff) -> None:
-        if file.exists():
+        if self.exists(file):
             self.error(f"'{file}' can't create, already exists")
             return
 
-        self.backup.create_or_rename(file)
-        lines = whatthepatch.apply_diff(diff.to_diffobj(), "")
-        file.write_text("\n".join(lines))
+        if self.overlay is not None:
+            self.overlay.write(file, self.patch_cached(diff, b""))
+        else:
+            self.backup.create_or_rename(file)
+            file.write_bytes(self.patch_cached(diff, b""))
         self.debug(f"'{file}' created")
 
     def update(self, file: Path, diff: Diff) -> None:
-        if not file.exists():
+        if not self.exists(file):
             self.error(f"'{file}' can't update, doesn't exist")
             return
 
-        text = file.read_bytes().decode()
+        if self.is_large(file) and (hunks := parse_hunks(diff.text)):
+            try:
+                self.update_stream(file, hunks)
+            except WhatThePatchException as e:
+                self.error(f"'{file}' can't update, failed to apply: {e}")
+                return
+            self.debug(f"'{file}' updated")
+            return
+
+        view = self.overlay or self.buffer
+        content = file.read_bytes() if view is None else view.read(file)
 
         try:
-            lines = whatthepatch.apply_diff(diff.to_diffobj(), text)
+            content = self.patch_cached(diff, content)
         except WhatThePatchException as e:
             self.error(f"'{file}' can't update, failed to apply: {e}")
             return
 
-        self.backup.edit_or_delete(file)
-        file.write_text("\n".join(lines))
+        if self.overlay is not None:
+            self.overlay.write(file, content)
+        elif self.buffer is not None:
+            # The file on disk is still the original until the buffer is flushed.
+            if not self.buffer.has(file):
+                self.backup.edit_or_delete(file)
+            self.buffer.write(file, content)
+        else:
+            self.backup.edit_or_delete(file)
+            file.write_bytes(content)
         self.debug(f"'{file}' updated")
 
+    def is_large(self, file: Path) -> bool:
+        if self.overlay is not None:
+            return False
+        if self.buffer is not None and self.buffer.has(file):
+            return False
+        return file.stat().st_size >= self.stream_size
+
+    def update_stream(self, file: Path, hunks: list[Hunk]) -> None:
+        """
+        Update a file through a temporary file, it's never read to memory.
+        """
+        fd, tmp = tempfile.mkstemp(dir=file.parent, prefix=".tmp_")
+        try:
+            with file.open("rb") as src, os.fdopen(fd, "wb") as dst:
+                with profiler.phase("hunks"):
+                    apply_hunks_stream(src, dst, hunks)
+            shutil.copymode(file, tmp)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+        self.backup.edit_or_delete(file)
+        os.replace(tmp, file)
+
+    def exists(self, file: Path) -> bool:
+        if self.overlay is not None:
+            return self.overlay.exists(file)
+        return file.exists()
+
+    def patch_cached(self, diff: Diff, content: bytes) -> bytes:
+        if self.output_cache is None:
+            return self.patch(diff, content)
+
+        key = self.output_cache.key(content, diff.text)
+        if (patched := self.output_cache.read(key)) is not None:
+            return patched
+
+        patched = self.patch(diff, content)
+        self.output_cache.store(key, patched)
+        return patched
+
     @staticmethod
-    def read(uri: str) -> str:
-        if uri.startswith("http://") or uri.startswith("https://"):
-            return requests.get(uri).content.decode()
-        else:
-            return Path(uri).read_bytes().decode()
+    def patch(diff: Diff, content: bytes) -> bytes:
+        with profiler.phase("hunks"):
+            if hunks := parse_hunks(diff.text):
+                return apply_hunks(content, hunks)
+
+            # Not a unified diff.
+            lines = whatthepatch.apply_diff(diff.to_diffobj(), content.decode())
+            return "\n".join(lines).encode()
+
+    def read(self, uri: str) -> str:
+        if uri in self.texts:
+            return self.texts[uri]
+        return self.fetcher.fetch(uri)
 
     @staticmethod
     def is_empty(path: str) -> bool:
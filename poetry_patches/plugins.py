@@ -1,16 +1,96 @@
-from poetry.console.application import Application
-from poetry.console.commands.command import Command
+from __future__ import annotations
+
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+from cleo.events.console_events import TERMINATE
 from poetry.plugins import ApplicationPlugin
 
-from poetry_patches.commands import PatchesApplyCommand, PatchesRevertCommand
-from poetry_patches.state.backup import Backup
+if TYPE_CHECKING:
+    from cleo.events.console_terminate_event import ConsoleTerminateEvent
+    from cleo.events.event_dispatcher import EventDispatcher
+    from poetry.console.application import Application
+    from poetry.console.commands.command import Command
+
+# The command classes are only imported when a patches command runs,
+# `poetry_patches.commands` pulls in `requests`, `whatthepatch` and the env.
+COMMANDS = {
+    "patches apply": "PatchesApplyCommand",
+    "patches revert": "PatchesRevertCommand",
+    "patches check": "PatchesCheckCommand",
+    "patches cache": "PatchesCacheCommand",
+    "patches status": "PatchesStatusCommand",
+    "patches migrate": "PatchesMigrateCommand",
+    "patches gc": "PatchesGcCommand",
+}
+
+# The commands that install distributions into the environment.
+INSTALLERS = {"install", "sync", "add", "remove", "update"}
+
+
+def load_command(class_name: str) -> type[Command]:
+    return getattr(import_module("poetry_patches.commands"), class_name)
 
 
 class PoetryPatchesPlugin(ApplicationPlugin):
     @property
     def commands(self) -> list[type[Command]]:
-        return [PatchesApplyCommand, PatchesRevertCommand]
+        return [load_command(class_name) for class_name in COMMANDS.values()]
 
     def activate(self, application: Application) -> None:
-        Backup.init_dir()
-        super().activate(application)
+        for name, class_name in COMMANDS.items():
+            application.command_loader.register_factory(
+                name, lambda class_name=class_name: load_command(class_name)()
+            )
+        application.event_dispatcher.add_listener(TERMINATE, self.reapply)
+
+    @staticmethod
+    def reapply(
+        event: ConsoleTerminateEvent, event_name: str, dispatcher: EventDispatcher
+    ) -> None:
+        """
+        Repatch the distributions (re)installed by an installer command.
+        """
+        command = event.command
+        if event.exit_code != 0 or command.name not in INSTALLERS:
+            return
+
+        from poetry.console.commands.installer_command import InstallerCommand
+
+        if (
+            not isinstance(command, InstallerCommand)
+            or command.io.input.has_option("dry-run")
+            and command.option("dry-run")
+            or command.io.input.has_option("lock")
+            and command.option("lock")
+        ):
+            return
+
+        poetry = command.poetry
+        if not poetry.pyproject.data.get("tool", {}).get("poetry-patches"):
+            return
+
+        from poetry_patches.cache import OutputCache, ParseCache, PatchCache
+        from poetry_patches.fetcher import Fetcher
+        from poetry_patches.patcher import PoetryPatcher
+        from poetry_patches.state.backup import Backup
+
+        # The installer succeeded, a failure to patch doesn't change its result.
+        try:
+            Backup.init_dir()
+            fetcher = Fetcher(cache=PatchCache.get())
+            output_cache = OutputCache.get()
+            PoetryPatcher(
+                poetry,
+                event.io,
+                Backup.get(),
+                fetcher,
+                parse_cache=ParseCache.get(),
+                output_cache=output_cache,
+                env=command.env,
+            ).reapply()
+            output_cache.prune()
+        except Exception as e:
+            event.io.write_error_line(
+                f"<error>The patches couldn't be reapplied: {e}</error>"
+            )
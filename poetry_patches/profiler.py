@@ -0,0 +1,76 @@
+import json
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import ContextManager
+
+
+class Profiler:
+    """
+    Records how long the phases of a run take.
+
+    Disabled by default, a phase is then a no-op. The spans can be summarized
+    per phase or written as a Chrome trace (`chrome://tracing`, Perfetto).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.start = 0.0
+        self.spans: list[tuple[str, dict, float, float, int]] = []
+        self.lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.enabled = True
+        self.start = time.perf_counter()
+        self.spans = []
+
+    def phase(self, name: str, **args) -> ContextManager[None]:
+        if not self.enabled:
+            return nullcontext()
+        return self.record(name, args)
+
+    @contextmanager
+    def record(self, name: str, args: dict) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            span = (name, args, start - self.start, duration, threading.get_ident())
+            with self.lock:
+                self.spans.append(span)
+
+    def summary(self) -> list[tuple[str, int, float, float]]:
+        """
+        Get the count, the total and the maximum seconds of each phase.
+        """
+        phases: dict[str, list] = {}
+        for name, _, _, duration, _ in self.spans:
+            phase = phases.setdefault(name, [name, 0, 0.0, 0.0])
+            phase[1] += 1
+            phase[2] += duration
+            phase[3] = max(phase[3], duration)
+        return sorted(map(tuple, phases.values()), key=lambda phase: -phase[2])
+
+    def write_trace(self, path: Path) -> None:
+        pid = os.getpid()
+        events = [
+            {
+                "name": name,
+                "cat": name,
+                "ph": "X",
+                "ts": start * 1_000_000,
+                "dur": duration * 1_000_000,
+                "pid": pid,
+                "tid": tid,
+                "args": args,
+            }
+            for name, args, start, duration, tid in self.spans
+        ]
+        path.write_text(json.dumps({"traceEvents": events}))
+
+
+profiler = Profiler()
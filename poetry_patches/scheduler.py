@@ -0,0 +1,45 @@
+from collections.abc import Callable, Hashable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+class Scheduler:
+    """
+    A class for running tasks on a worker pool.
+
+    Every task has a set of keys (e.g. the paths it touches), a task only starts
+    after the earlier tasks sharing a key with it have finished.
+    """
+
+    def __init__(self, jobs: int = 1):
+        self.jobs = jobs
+
+    def run(self, tasks: list[tuple[Callable[[], T], Iterable[Hashable]]]) -> list[T]:
+        """
+        Run the tasks, return their results in the order of the tasks.
+        """
+        if self.jobs <= 1 or len(tasks) <= 1:
+            return [task() for task, _ in tasks]
+
+        last: dict[Hashable, Future] = {}
+        futures = []
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            for task, keys in tasks:
+                keys = set(keys)
+                dependencies = {last[key] for key in keys if key in last}
+                # The executor starts tasks in submission order, so the
+                # dependencies are already running when a task waits for them.
+                future = executor.submit(self.run_after, task, dependencies)
+                futures.append(future)
+                for key in keys:
+                    last[key] = future
+
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def run_after(task: Callable[[], T], dependencies: set[Future]) -> T:
+        wait(dependencies)
+        return task()
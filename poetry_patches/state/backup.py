@@ -1,25 +1,70 @@
 import os
 import shutil
-import uuid
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
 
-from poetry_patches import BACKUPS
-from poetry_patches.state.meta import Meta
+from poetry_patches import BACKUPS, ENVS, META
+from poetry_patches.bytecode import invalidate
+from poetry_patches.compression import (
+    CHUNK_SIZE,
+    CODECS,
+    compress_file,
+    is_compressed,
+    open_backup,
+)
+from poetry_patches.profiler import profiler
+from poetry_patches.scheduler import Scheduler
+from poetry_patches.state.meta import Meta, open_meta
+from poetry_patches.utils import copy_file, hash_bytes, hash_file
 
 
 class Backup:
-    def __init__(self, meta: Meta, backups: Path):
+    """
+    A class for the `.poetry-patches/backups/` directory.
+
+    Backups are content addressed, files with the same content share a backup.
+    With a `compression` codec, the backups of large files are compressed.
+    """
+
+    # Files from this size on are compressed.
+    COMPRESS_SIZE = 2**20
+
+    def __init__(self, meta: Meta, backups: Path, compression: str | None = None):
         self.meta = meta
         self.backups = backups
+        self.compression = compression
+        self.compress_size = self.COMPRESS_SIZE
+        self.lock = threading.RLock()
 
     @classmethod
     def get(cls):
-        return cls(Meta.get(), BACKUPS)
+        return cls(open_meta(META), BACKUPS)
+
+    @classmethod
+    def for_env(cls, env: Path):
+        """
+        Get the backups of another environment, in `.poetry-patches/envs/<hash>/`.
+        """
+        directory = ENVS / hash_bytes(str(env.resolve()).encode())[:16]
+        return cls(open_meta(directory / "meta.json"), directory / "backups")
 
     @staticmethod
-    def init_dir() -> None:
-        if not BACKUPS.exists():
-            BACKUPS.mkdir(parents=True, exist_ok=True)
+    def init_dir(backups: Path = BACKUPS) -> None:
+        if not backups.exists():
+            backups.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Keep the meta in memory and write it once at the end.
+        """
+        with self.meta.transaction():
+            yield
 
     def clear(self) -> None:
         self.meta.clear()
@@ -31,53 +76,208 @@ class Backup:
         Create a backup for an edited or deleted file.
         """
         src = str(file.resolve())
-        self.meta.load()
-
-        if self.meta.has_backup(src):
-            return
-
-        backup = self.backups / self.get_backup_name(file)
-        if backup.exists():
-            return
+        with self.lock:
+            self.meta.load()
+            if self.meta.has_backup(src):
+                return
 
-        # Copy the file to './poetry-patches/backups/'.
+        # Copy the file to './poetry-patches/backups/', unless it's already there.
+        with profiler.phase("backup", file=src):
+            backup = self.create_backup(file)
         dst = str(backup.resolve())
-        shutil.copy(src, dst)
 
         # Store the backup entry in './poetry-patches/meta.json'.
-        self.meta.set_backup(src, dst)
-        self.meta.dump()
+        with self.lock:
+            self.meta.set_backup(src, dst)
+            self.meta.dump()
 
     @staticmethod
     def get_backup_name(file: Path) -> str:
-        root, ext = os.path.splitext(file.name)
-        suffix = str(uuid.uuid4())[:8]
-        return f"{root}_{suffix}{ext}"
+        return hash_file(file)
+
+    def create_backup(self, file: Path) -> Path:
+        backup = self.backups / self.get_backup_name(file)
+        if backup.exists():
+            return backup
+
+        if self.compression is not None and file.stat().st_size >= self.compress_size:
+            backup = backup.with_name(f"{backup.name}{CODECS[self.compression]}")
+            if not backup.exists():
+                compress_file(file, backup)
+            return backup
+
+        copy_file(file, backup)
+        return backup
 
     def create_or_rename(self, file: Path) -> None:
         """
         Create a backup for a created or renamed file.
         """
         path = str(file.resolve())
+        with self.lock:
+            self.meta.load()
+            if not self.meta.has_backup(path):
+                self.meta.set_backup(path, None)
+                self.meta.dump()
+
+    def revert(self, files: Iterable[str] | None = None, jobs: int = 1) -> Counter:
+        """
+        Revert the patches, or only the given files.
+
+        Return the number of files restored, deleted and skipped.
+        """
         self.meta.load()
+        backups = self.meta.get_backups()
+        keys = list(backups) if files is None else [f for f in files if f in backups]
 
-        if not self.meta.has_backup(path):
-            self.meta.set_backup(path, None)
-            self.meta.dump()
+        # A backup used by a single file can be moved back instead of copied.
+        tasks = [
+            (
+                partial(
+                    self.restore,
+                    Path(key),
+                    backups[key],
+                    self.meta.get_references(backups[key]),
+                ),
+                [key],
+            )
+            for key in keys
+        ]
+        with profiler.phase("restore"):
+            reverted = Counter(Scheduler(jobs).run(tasks))
+
+        if files is None:
+            self.clear()
+            return reverted
+
+        self.discard(keys)
+        return reverted
 
-    def revert(self) -> None:
+    def revert_package(self, key: str, jobs: int = 1) -> Counter | None:
         """
-        Revert the patches.
+        Revert the files of a package only, return `None` if it isn't patched.
+        """
+        package = self.get_package(key)
+        if package is None:
+            return None
+
+        reverted = self.revert(package["files"], jobs)
+        self.set_package(key, None)
+        return reverted
+
+    def revert_packages(self, keys: Iterable[str], jobs: int = 1) -> Counter:
+        reverted = Counter()
+        with self.transaction():
+            for key in keys:
+                reverted.update(self.revert_package(key, jobs) or Counter())
+        return reverted
+
+    def forget(self, files: dict[str, str | None]) -> None:
+        """
+        Forget the backups of files overwritten by a reinstall.
+
+        The installed files are the originals now, only the files created by
+        a patch are deleted, unless the installer replaced them.
         """
         self.meta.load()
+        backups = self.meta.get_backups()
+        keys = [file for file in files if file in backups]
+
+        for key in keys:
+            if backups[key] is None and hash_file(Path(key)) == files[key]:
+                Path(key).unlink(missing_ok=True)
+
+        self.discard(keys)
 
-        for key, value in self.meta.get_backups().items():
-            file = Path(key)
+    def discard(self, keys: list[str]) -> None:
+        deleted = {self.meta.delete_backup(key) for key in keys}
+        for value in deleted - {None}:
+            # A backup may still be shared by another file.
+            if not self.meta.get_references(value):
+                Path(value).unlink(missing_ok=True)
+        self.meta.dump()
+
+    def gc(self) -> tuple[int, int]:
+        """
+        Delete the backups that no file refers to, e.g. left by an interrupted run.
+
+        Return the number of backups deleted and their size.
+        """
+        deleted = size = 0
+        start = time.time_ns()
+        # Wait for the transaction of a run in progress. Outside a transaction
+        # a backup is copied before it's recorded, so the files written since
+        # the start are left alone, temporary files of a copy included.
+        with self.transaction():
+            referenced = {
+                Path(value).name
+                for value in self.meta.get_backups().values()
+                if value is not None
+            }
+            with os.scandir(self.backups) as entries:
+                for entry in entries:
+                    if (
+                        not entry.is_file()
+                        or entry.name in referenced
+                        or entry.stat().st_mtime_ns >= start
+                    ):
+                        continue
+                    size += entry.stat().st_size
+                    os.unlink(entry.path)
+                    deleted += 1
+        return deleted, size
+
+    @staticmethod
+    def restore(file: Path, value: str | None, references: int) -> str:
+        # Drop the bytecode of the patched source.
+        invalidate(file)
 
-            if value is None:
-                file.unlink(missing_ok=True)
-            else:
-                backup = Path(value).read_bytes()
-                file.write_bytes(backup)
+        if value is None:
+            try:
+                file.unlink()
+            except FileNotFoundError:
+                return "skipped"
+            return "deleted"
 
-        self.clear()
+        backup = Path(value)
+        if not backup.exists():
+            return "skipped"
+
+        if is_compressed(backup):
+            with open_backup(backup) as src, file.open("wb") as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            return "restored"
+
+        if references == 1:
+            try:
+                if file.exists():
+                    shutil.copymode(file, backup)
+                os.replace(backup, file)
+                return "restored"
+            except OSError:
+                # E.g. the backup is on another filesystem.
+                pass
+
+        # Copies in the kernel where it's supported, e.g. sendfile on Linux.
+        shutil.copyfile(backup, file)
+        return "restored"
+
+    def get_backups(self) -> dict[str, str | None]:
+        self.meta.load()
+        return self.meta.get_backups()
+
+    def get_packages(self) -> dict[str, dict]:
+        self.meta.load()
+        return self.meta.get_packages()
+
+    def get_package(self, key: str) -> dict | None:
+        self.meta.load()
+        return self.meta.get_package(key)
+
+    def set_package(self, key: str, value: dict | None) -> None:
+        """
+        Store the fingerprint of a patched package.
+        """
+        self.meta.load()
+        self.meta.set_package(key, value)
+        self.meta.dump()
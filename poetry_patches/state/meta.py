@@ -1,43 +1,229 @@
 import copy
 import json
+import os
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 from poetry_patches import META
+from poetry_patches.profiler import profiler
+
+if TYPE_CHECKING:
+    from poetry_patches.state.sqlite import SqliteMeta
+
+# The state backends, by the suffix of their file next to `meta.json`.
+BACKENDS = {"json": ".json", "sqlite": ".db"}
 
 
 class Meta:
     """
     A class for the `.poetry-caches/meta.json` file.
+
+    Inside a transaction the state is kept in memory and written once on
+    commit. Every change is also appended to `meta.json.journal`, so the
+    changes of an interrupted run are replayed on the next load. A
+    transaction holds a lock on `meta.json.lock`, concurrent runs wait.
+
+    The backups are keyed by the absolute path of a file, the packages record
+    the files each of their patches changed. The number of files sharing a
+    backup is counted, so a package is reverted without a scan of the others.
     """
 
     DEFAULT = {"backups": {}}
 
     def __init__(self, meta: Path):
         self.meta = meta
+        self.journal = meta.with_name(f"{meta.name}.journal")
+        self.lock = meta.with_name(f"{meta.name}.lock")
         self.data = copy.deepcopy(self.DEFAULT)
+        self.references: Counter = Counter()
+        self.transactions = 0
+        self.journal_file = None
 
     @classmethod
     def get(cls):
         return cls(META)
 
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        if self.transactions:
+            yield
+            return
+
+        with self.locked():
+            # Another run moved the state while this one waited for the lock.
+            if (database := self.meta.with_suffix(BACKENDS["sqlite"])).exists():
+                raise RuntimeError(f"'{self.meta}' can't load, moved to '{database}'")
+            self.load()
+            self.transactions += 1
+            self.journal_file = self.journal.open("a")
+            try:
+                yield
+            finally:
+                self.journal_file.close()
+                self.journal_file = None
+                self.transactions -= 1
+                self.dump()
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """
+        Hold the lock on `meta.json.lock`, until the end of the block.
+        """
+        with self.lock.open("a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
     def clear(self) -> None:
-        self.data = copy.deepcopy(self.DEFAULT)
+        self.reset()
         self.dump()
 
+    def reset(self) -> None:
+        self.data = copy.deepcopy(self.DEFAULT)
+        self.references = Counter()
+        self.log("reset")
+
     def load(self) -> None:
+        if self.transactions:
+            return
+
         if self.meta.exists():
             text = self.meta.read_text()
             self.data = json.loads(text)
+            self.references = Counter(self.data["backups"].values())
+        if self.journal.exists():
+            self.replay()
 
     def dump(self) -> None:
-        text = json.dumps(self.data, indent=4)
-        self.meta.write_text(text)
+        if self.transactions:
+            return
+
+        # Write to a temporary file first, `meta.json` is never left half-written.
+        with profiler.phase("meta"):
+            text = json.dumps(self.data, indent=4)
+            tmp = self.meta.with_name(f"{self.meta.name}.tmp")
+            tmp.write_text(text)
+            os.replace(tmp, self.meta)
+            self.journal.unlink(missing_ok=True)
+
+    def log(self, *entry) -> None:
+        if self.journal_file is None:
+            return
+
+        self.journal_file.write(json.dumps(entry) + "\n")
+        self.journal_file.flush()
+
+    def replay(self) -> None:
+        """
+        Replay the journal of an interrupted transaction.
+        """
+        for line in self.journal.read_text().splitlines():
+            try:
+                name, *args = json.loads(line)
+            except ValueError:
+                # The last entry may be incomplete.
+                break
+            getattr(self, name)(*args)
 
     def set_backup(self, key: str, value: str | None) -> None:
+        if key in self.data["backups"]:
+            self.references[self.data["backups"][key]] -= 1
         self.data["backups"][key] = value
+        self.references[value] += 1
+        self.log("set_backup", key, value)
 
     def has_backup(self, key: str) -> bool:
         return key in self.data["backups"]
 
+    def delete_backup(self, key: str) -> str | None:
+        self.log("delete_backup", key)
+        if key not in self.data["backups"]:
+            return None
+        value = self.data["backups"].pop(key)
+        self.references[value] -= 1
+        return value
+
     def get_backups(self) -> dict[str, str | None]:
         return self.data["backups"]
+
+    def get_references(self, value: str | None) -> int:
+        """
+        Get the number of files that share a backup.
+        """
+        return self.references[value]
+
+    def set_package(self, key: str, value: dict | None) -> None:
+        packages = self.data.setdefault("packages", {})
+        if value is None:
+            packages.pop(key, None)
+        else:
+            packages[key] = value
+        self.log("set_package", key, value)
+
+    def get_package(self, key: str) -> dict | None:
+        return self.data.get("packages", {}).get(key)
+
+    def get_packages(self) -> dict[str, dict]:
+        return self.data.get("packages", {})
+
+
+def open_meta(meta: Path) -> "Meta | SqliteMeta":
+    """
+    Open the state next to `meta`, the database if it was migrated to sqlite.
+    """
+    database = meta.with_suffix(BACKENDS["sqlite"])
+    if database.exists():
+        from poetry_patches.state.sqlite import SqliteMeta
+
+        return SqliteMeta(database)
+    return Meta(meta)
+
+
+def migrate(meta: Path, backend: str) -> bool:
+    """
+    Move the state next to `meta` to another backend, return `False` if it's there.
+    """
+    src = open_meta(meta)
+    if src.meta.suffix == BACKENDS[backend]:
+        return False
+
+    # The source stays locked until it's removed, a run waiting for the lock
+    # finds the state moved and stops instead of writing the old one.
+    if backend == "sqlite":
+        from poetry_patches.state.sqlite import SqliteMeta
+
+        dst = SqliteMeta(meta.with_suffix(BACKENDS[backend]))
+        with src.locked():
+            src.load()
+            with dst.transaction():
+                copy_meta(src, dst)
+            dst.close()
+            src.journal.unlink(missing_ok=True)
+            src.meta.unlink(missing_ok=True)
+            src.lock.unlink(missing_ok=True)
+    else:
+        dst = Meta(meta)
+        with src.transaction(), dst.locked():
+            copy_meta(src, dst)
+            dst.dump()
+            src.meta.unlink()
+        src.close()
+        for suffix in ("-wal", "-shm"):
+            src.meta.with_name(f"{src.meta.name}{suffix}").unlink(missing_ok=True)
+    return True
+
+
+def copy_meta(src: "Meta | SqliteMeta", dst: "Meta | SqliteMeta") -> None:
+    dst.reset()
+    for key, value in src.get_backups().items():
+        dst.set_backup(key, value)
+    for key, value in src.get_packages().items():
+        dst.set_package(key, value)
@@ -0,0 +1,136 @@
+import json
+import sqlite3
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from poetry_patches.profiler import profiler
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (file TEXT PRIMARY KEY, backup TEXT);
+CREATE INDEX IF NOT EXISTS backups_backup ON backups (backup);
+CREATE TABLE IF NOT EXISTS packages (name TEXT PRIMARY KEY, data TEXT NOT NULL);
+"""
+
+
+class SqliteMeta:
+    """
+    A class for the `.poetry-patches/meta.db` database, the same API as `Meta`.
+
+    Every change is written to the database at once, a transaction holds the
+    write lock until it ends, so concurrent runs wait for each other instead
+    of overwriting each other's state. The shared backups are counted by an
+    index instead of in memory.
+    """
+
+    # Seconds to wait for the lock held by another run.
+    TIMEOUT = 60
+
+    def __init__(self, meta: Path):
+        self.meta = meta
+        self.transactions = 0
+        self._connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.meta.parent.mkdir(parents=True, exist_ok=True)
+            # Transactions are explicit, the patcher writes from worker threads.
+            self._connection = sqlite3.connect(
+                self.meta,
+                timeout=self.TIMEOUT,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.execute("PRAGMA synchronous = NORMAL")
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        if self.transactions:
+            yield
+            return
+
+        self.connection.execute("BEGIN IMMEDIATE")
+        # Another run moved the state while this one waited for the lock.
+        if not self.meta.exists():
+            self.connection.execute("ROLLBACK")
+            json_path = self.meta.with_suffix(".json")
+            raise RuntimeError(f"'{self.meta}' can't load, moved to '{json_path}'")
+        self.transactions += 1
+        try:
+            yield
+        finally:
+            self.transactions -= 1
+            # The files were changed already, keep their state even on errors.
+            with profiler.phase("meta"):
+                self.connection.execute("COMMIT")
+
+    def clear(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        with self.transaction():
+            self.connection.execute("DELETE FROM backups")
+            self.connection.execute("DELETE FROM packages")
+
+    def load(self) -> None:
+        pass
+
+    def dump(self) -> None:
+        pass
+
+    def set_backup(self, key: str, value: str | None) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO backups VALUES (?, ?)", (key, value)
+        )
+
+    def has_backup(self, key: str) -> bool:
+        cursor = self.connection.execute("SELECT 1 FROM backups WHERE file = ?", (key,))
+        return cursor.fetchone() is not None
+
+    def delete_backup(self, key: str) -> str | None:
+        with self.transaction():
+            row = self.connection.execute(
+                "SELECT backup FROM backups WHERE file = ?", (key,)
+            ).fetchone()
+            self.connection.execute("DELETE FROM backups WHERE file = ?", (key,))
+        return None if row is None else row[0]
+
+    def get_backups(self) -> dict[str, str | None]:
+        return dict(self.connection.execute("SELECT file, backup FROM backups"))
+
+    def get_references(self, value: str | None) -> int:
+        """
+        Get the number of files that share a backup.
+        """
+        cursor = self.connection.execute(
+            "SELECT COUNT(*) FROM backups WHERE backup IS ?", (value,)
+        )
+        return cursor.fetchone()[0]
+
+    def set_package(self, key: str, value: dict | None) -> None:
+        if value is None:
+            self.connection.execute("DELETE FROM packages WHERE name = ?", (key,))
+        else:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO packages VALUES (?, ?)",
+                (key, json.dumps(value)),
+            )
+
+    def get_package(self, key: str) -> dict | None:
+        row = self.connection.execute(
+            "SELECT data FROM packages WHERE name = ?", (key,)
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def get_packages(self) -> dict[str, dict]:
+        cursor = self.connection.execute("SELECT name, data FROM packages")
+        return {name: json.loads(data) for name, data in cursor}
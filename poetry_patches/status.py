@@ -0,0 +1,43 @@
+import os
+from pathlib import Path
+
+from poetry_patches.utils import hash_file
+
+
+def get_stat(file: Path) -> list[int] | None:
+    """
+    Get the size and the modification time of a file.
+    """
+    try:
+        stat = os.stat(file)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def get_file_status(file: Path, sha256: str | None, stat: list[int] | None) -> str:
+    """
+    Check that a file still has its patched content, `intact`, `drifted` or `missing`.
+
+    The file is only hashed if its size or modification time changed.
+    """
+    current = get_stat(file)
+    if sha256 is None:
+        # Deleted or renamed by a patch.
+        return "intact" if current is None else "drifted"
+    if current is None:
+        return "missing"
+    if current == stat or hash_file(file) == sha256:
+        return "intact"
+    return "drifted"
+
+
+def get_status(package: dict) -> dict[str, str]:
+    """
+    Check the files of a patched package.
+    """
+    stats = package.get("stats", {})
+    return {
+        file: get_file_status(Path(file), sha256, stats.get(file))
+        for file, sha256 in package["files"].items()
+    }
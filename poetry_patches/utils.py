@@ -0,0 +1,70 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# The Linux ioctl for cloning a file (btrfs, xfs, ...).
+FICLONE = 0x40049409
+
+
+def hash_bytes(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def hash_file(file: Path) -> str | None:
+    """
+    Hash a file in chunks, `None` if it doesn't exist.
+    """
+    try:
+        with file.open("rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def copy_file(src: Path, dst: Path) -> None:
+    """
+    Copy a file atomically, as a copy-on-write reflink where it's supported.
+    """
+    tmp = dst.with_name(f".tmp_{uuid.uuid4().hex}")
+    try:
+        if not reflink(src, tmp):
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def reflink(src: Path, dst: Path) -> bool:
+    if fcntl is None:
+        return False
+
+    with src.open("rb") as s, dst.open("wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            return False
+    return True
+
+
+def write_atomic(path: Path, content: bytes) -> None:
+    """
+    Write a file through a temporary file, readers never see a partial file.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
@@ -0,0 +1,59 @@
+from pathlib import Path
+
+from poetry_patches.fetcher import Fetcher
+from poetry_patches.status import get_stat
+
+
+class Watcher:
+    """
+    Polls files for changes of their size or modification time.
+    """
+
+    def __init__(self, files: list[Path]):
+        self.stamps = {file: get_stat(file) for file in files}
+
+    def watch(self, files: list[Path]) -> None:
+        """
+        Replace the watched files, the new ones are compared from now on.
+        """
+        self.stamps = {
+            file: self.stamps[file] if file in self.stamps else get_stat(file)
+            for file in files
+        }
+
+    def poll(self) -> set[Path]:
+        """
+        Get the files changed since the last poll.
+        """
+        changed = set()
+        for file, stamp in self.stamps.items():
+            if (current := get_stat(file)) != stamp:
+                self.stamps[file] = current
+                changed.add(file)
+        return changed
+
+
+def get_local_files(config: dict[str, list[str]]) -> dict[Path, set[str]]:
+    """
+    Get the local patch files, with the packages that use them.
+    """
+    files: dict[Path, set[str]] = {}
+    for key, uris in config.items():
+        for uri in uris:
+            location, _ = Fetcher.split_uri(uri)
+            if not Fetcher.is_remote(location):
+                files.setdefault(Path(location).resolve(), set()).add(key)
+    return files
+
+
+def get_changed_packages(
+    old: dict[str, list[str]], new: dict[str, list[str]], changed: set[Path]
+) -> set[str]:
+    """
+    Get the packages whose patches changed, were added or were removed.
+    """
+    keys = {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+    for file, packages in get_local_files(new).items():
+        if file in changed:
+            keys |= packages
+    return keys
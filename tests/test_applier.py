@@ -0,0 +1,112 @@
+import io
+
+import pytest
+from whatthepatch.exceptions import HunkApplyException
+
+from poetry_patches.applier import apply_hunks, apply_hunks_stream, parse_hunks
+
+DIFF = """\
+--- a/file.txt
++++ b/file.txt
+@@ -1,3 +1,3 @@
+ a
+-b
++B
+ c
+@@ -5,2 +5,3 @@
+ e
+ f
++g
+"""
+
+
+def test_apply_hunks() -> None:
+    content = b"a\nb\nc\nd\ne\nf\n"
+
+    assert apply_hunks(content, parse_hunks(DIFF)) == b"a\nB\nc\nd\ne\nf\ng\n"
+
+
+def test_apply_hunks_crlf() -> None:
+    content = b"a\r\nb\r\nc\r\nd\r\ne\r\nf\r\n"
+
+    assert (
+        apply_hunks(content, parse_hunks(DIFF))
+        == b"a\r\nB\r\nc\r\nd\r\ne\r\nf\r\ng\r\n"
+    )
+
+
+def test_apply_hunks_no_newline() -> None:
+    diff = """\
+--- a/file.txt
++++ b/file.txt
+@@ -1,2 +1,3 @@
+ a
+-b
+\\ No newline at end of file
++b
++c
+\\ No newline at end of file
+"""
+
+    assert apply_hunks(b"a\nb", parse_hunks(diff)) == b"a\nb\nc"
+
+
+def test_apply_hunks_create() -> None:
+    diff = """\
+--- /dev/null
++++ b/file.txt
+@@ -0,0 +1,2 @@
++a
++b
+"""
+
+    assert apply_hunks(b"", parse_hunks(diff)) == b"a\nb\n"
+
+
+def test_apply_hunks_binary() -> None:
+    content = b"a\nb\xff\nc\nd\ne\nf\n"
+    diff = DIFF.replace("@@ -1,3 +1,3 @@\n a\n-b\n+B\n c\n", "")
+
+    assert apply_hunks(content, parse_hunks(diff)) == b"a\nb\xff\nc\nd\ne\nf\ng\n"
+
+
+def test_apply_hunks_mismatch() -> None:
+    with pytest.raises(HunkApplyException):
+        apply_hunks(b"a\nx\nc\nd\ne\nf\n", parse_hunks(DIFF))
+
+    with pytest.raises(HunkApplyException):
+        apply_hunks(b"a\nb\nc\n", parse_hunks(DIFF))
+
+
+def apply_hunks_stream_bytes(content: bytes, hunks) -> bytes:
+    dst = io.BytesIO()
+    apply_hunks_stream(io.BytesIO(content), dst, hunks)
+    return dst.getvalue()
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        b"a\nb\nc\nd\ne\nf\n",
+        b"a\r\nb\r\nc\r\nd\r\ne\r\nf\r\n",
+        b"a\nb\nc\nd\ne\nf\nrest\nof\nthe\nfile",
+    ],
+)
+def test_apply_hunks_stream(content: bytes) -> None:
+    hunks = parse_hunks(DIFF)
+
+    assert apply_hunks_stream_bytes(content, hunks) == apply_hunks(content, hunks)
+
+
+def test_apply_hunks_stream_create() -> None:
+    diff = "--- /dev/null\n+++ b/file.txt\n@@ -0,0 +1,2 @@\n+a\n+b\n"
+
+    assert apply_hunks_stream_bytes(b"", parse_hunks(diff)) == b"a\nb\n"
+
+
+def test_apply_hunks_stream_mismatch() -> None:
+    with pytest.raises(HunkApplyException):
+        apply_hunks_stream_bytes(b"a\nx\nc\nd\ne\nf\n", parse_hunks(DIFF))
+
+    with pytest.raises(HunkApplyException):
+        apply_hunks_stream_bytes(b"a\nb\nc\n", parse_hunks(DIFF))
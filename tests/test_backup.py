@@ -1,8 +1,12 @@
+import os
+import time
 from pathlib import Path
 
 import pytest
 
+from poetry_patches.overlay import Overlay
 from poetry_patches.state.backup import Backup
+from poetry_patches.utils import hash_bytes
 from tests.conftest import assert_meta
 
 
@@ -26,8 +30,7 @@ class TestBackup:
         backups = list(self.backups_path.glob("*"))
         assert len(backups) == 1
         backup = backups[0]
-        assert backup.name.startswith("edit_or_delete_")
-        assert backup.name.endswith(".txt")
+        assert backup.name == hash_bytes(b"1")
         assert backup.read_text() == "1"
         assert_meta(
             self.meta_path, {"backups": {str(file.resolve()): str(backup.resolve())}}
@@ -64,3 +67,179 @@ class TestBackup:
         assert file.read_text() == "1"
         assert list(self.backups_path.glob("*")) == []
         assert_meta(self.meta_path, {"backups": {}})
+
+    def test_revert_invalidates_bytecode(self) -> None:
+        file = self.tmp_path / "revert_bytecode.py"
+        file.write_text("VALUE = 1\n")
+        self.backup.edit_or_delete(file)
+        file.write_text("VALUE = 2\n")
+        pyc = self.tmp_path / "__pycache__" / "revert_bytecode.cpython-311.pyc"
+        pyc.parent.mkdir()
+        pyc.touch()
+
+        self.backup.revert()
+
+        assert file.read_text() == "VALUE = 1\n"
+        assert not pyc.exists()
+
+    def test_transaction(self) -> None:
+        file = self.tmp_path / "transaction.txt"
+        file.write_text("1")
+
+        with self.backup.transaction():
+            self.backup.edit_or_delete(file)
+            self.backup.create_or_rename(self.tmp_path / "transaction_2.txt")
+            assert not self.meta_path.exists()
+
+        backups = list(self.backups_path.glob("*"))
+        assert len(backups) == 1
+        assert_meta(
+            self.meta_path,
+            {
+                "backups": {
+                    str(file.resolve()): str(backups[0].resolve()),
+                    str((self.tmp_path / "transaction_2.txt").resolve()): None,
+                }
+            },
+        )
+
+    def test_edit_or_delete_same_content(self) -> None:
+        file_1 = self.tmp_path / "same_content.txt"
+        file_1.write_text("1")
+        file_2 = self.tmp_path / "same_content_2.txt"
+        file_2.write_text("1")
+
+        self.backup.edit_or_delete(file_1)
+        self.backup.edit_or_delete(file_2)
+
+        backups = list(self.backups_path.glob("*"))
+        assert len(backups) == 1
+        backup = str(backups[0].resolve())
+        assert_meta(
+            self.meta_path,
+            {"backups": {str(file_1.resolve()): backup, str(file_2.resolve()): backup}},
+        )
+
+        file_1.write_text("2")
+        file_2.write_text("2")
+        self.backup.revert([str(file_1.resolve())])
+
+        assert file_1.read_text() == "1"
+        assert file_2.read_text() == "2"
+        assert len(list(self.backups_path.glob("*"))) == 1
+
+        self.backup.revert([str(file_2.resolve())])
+
+        assert file_2.read_text() == "1"
+        assert list(self.backups_path.glob("*")) == []
+
+    def test_revert_package(self) -> None:
+        files = [self.tmp_path / f"revert_package_{i}.txt" for i in range(2)]
+        for file in files:
+            file.write_text("1")
+            self.backup.edit_or_delete(file)
+            file.write_text("2")
+        key = str(files[0].resolve())
+        self.backup.set_package("a", {"files": {key: None}})
+        self.backup.set_package("b", {"files": {str(files[1].resolve()): None}})
+
+        assert self.backup.revert_package("c") is None
+        assert self.backup.revert_packages(["a"]) == {"restored": 1}
+
+        assert [file.read_text() for file in files] == ["1", "2"]
+        # The backup is still used by the other package.
+        assert len(list(self.backups_path.glob("*"))) == 1
+        assert list(self.backup.get_packages()) == ["b"]
+
+    def test_forget(self) -> None:
+        edited = self.tmp_path / "forget.txt"
+        edited.write_text("1")
+        self.backup.edit_or_delete(edited)
+        edited.write_text("reinstalled")
+        created = self.tmp_path / "forget_created.txt"
+        self.backup.create_or_rename(created)
+        created.write_text("created")
+        replaced = self.tmp_path / "forget_replaced.txt"
+        self.backup.create_or_rename(replaced)
+        replaced.write_text("replaced")
+
+        self.backup.forget(
+            {
+                str(edited.resolve()): hash_bytes(b"patched"),
+                str(created.resolve()): hash_bytes(b"created"),
+                str(replaced.resolve()): hash_bytes(b"created"),
+            }
+        )
+
+        assert edited.read_text() == "reinstalled"
+        assert not created.exists()
+        assert replaced.read_text() == "replaced"
+        assert list(self.backups_path.glob("*")) == []
+        assert_meta(self.meta_path, {"backups": {}})
+
+    def test_revert_counts(self) -> None:
+        files = [self.tmp_path / f"revert_counts_{i}.txt" for i in range(4)]
+        for i, file in enumerate(files):
+            file.write_text(str(i))
+            self.backup.edit_or_delete(file)
+            file.write_text("patched")
+        created = self.tmp_path / "revert_counts_created.txt"
+        self.backup.create_or_rename(created)
+        created.write_text("created")
+        self.backup.create_or_rename(self.tmp_path / "revert_counts_missing.txt")
+
+        reverted = self.backup.revert(jobs=4)
+
+        assert reverted == {"restored": 4, "deleted": 1, "skipped": 1}
+        assert [file.read_text() for file in files] == ["0", "1", "2", "3"]
+        assert not created.exists()
+        assert list(self.backups_path.glob("*")) == []
+        assert_meta(self.meta_path, {"backups": {}})
+
+    @pytest.mark.parametrize("compression, suffix", [("zlib", ".gz"), ("lzma", ".xz")])
+    def test_revert_compressed(self, compression: str, suffix: str) -> None:
+        small = self.tmp_path / "small.txt"
+        small.write_text("small")
+        large = self.tmp_path / "large.txt"
+        large.write_bytes(b"large\n" * 1000)
+        self.backup.compression = compression
+        self.backup.compress_size = 1000
+
+        self.backup.edit_or_delete(small)
+        self.backup.edit_or_delete(large)
+        small.write_text("patched")
+        large.write_text("patched")
+
+        names = sorted(backup.name for backup in self.backups_path.glob("*"))
+        assert names == sorted(
+            [hash_bytes(b"small"), hash_bytes(b"large\n" * 1000) + suffix]
+        )
+        assert Overlay(self.backup.get_backups()).read(large) == b"large\n" * 1000
+
+        self.backup.revert()
+
+        assert small.read_text() == "small"
+        assert large.read_bytes() == b"large\n" * 1000
+        assert list(self.backups_path.glob("*")) == []
+
+    def test_gc(self) -> None:
+        file = self.tmp_path / "file.txt"
+        file.write_text("1")
+        self.backup.edit_or_delete(file)
+        # Left by an interrupted run.
+        orphan = self.backups_path / hash_bytes(b"2")
+        orphan.write_text("2")
+        os.utime(orphan, ns=(0, 0))
+        stale = self.backups_path / ".tmp_0123"
+        stale.write_text("33")
+        os.utime(stale, ns=(0, 0))
+        # Copied by a run in progress, not recorded yet.
+        for name in [".tmp_4567", hash_bytes(b"4")]:
+            new = self.backups_path / name
+            new.write_text("4")
+            os.utime(new, ns=(0, time.time_ns() + 10**9))
+
+        assert self.backup.gc() == (2, 3)
+        assert sorted(backup.name for backup in self.backups_path.glob("*")) == sorted(
+            [".tmp_4567", hash_bytes(b"1"), hash_bytes(b"4")]
+        )
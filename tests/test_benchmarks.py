@@ -0,0 +1,20 @@
+import pytest
+
+from benchmarks.run import SCENARIOS, main, run
+
+
+@pytest.mark.parametrize("name", list(SCENARIOS))
+def test_scenario(name: str) -> None:
+    phases = run(name, scale=0.005, repeat=1)
+
+    assert phases
+    for result in phases.values():
+        assert result["seconds"] > 0
+        assert result["peak_mib"] >= 0
+
+
+def test_repeat(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("sys.argv", ["run.py", "--repeat", "0"])
+
+    with pytest.raises(SystemExit):
+        main()
@@ -0,0 +1,35 @@
+import sys
+from importlib.util import cache_from_source
+from pathlib import Path
+
+from poetry.utils.env import SystemEnv
+
+from poetry_patches.bytecode import compile_files, invalidate
+
+
+def test_compile_files(tmp_path: Path) -> None:
+    modules = [tmp_path / f"module_{i}.py" for i in range(3)]
+    for module in modules:
+        module.write_text("VALUE = 1\n")
+
+    compile_files(SystemEnv(Path(sys.prefix)), modules[:2])
+
+    assert [Path(cache_from_source(str(m))).exists() for m in modules] == [
+        True,
+        True,
+        False,
+    ]
+
+
+def test_invalidate(tmp_path: Path) -> None:
+    module = tmp_path / "module.py"
+    module.write_text("VALUE = 1\n")
+    pycache = tmp_path / "__pycache__"
+    pycache.mkdir()
+    (pycache / "module.cpython-311.pyc").touch()
+    (pycache / "module.cpython-312.opt-1.pyc").touch()
+    (pycache / "other.cpython-311.pyc").touch()
+
+    invalidate(module)
+
+    assert [path.name for path in pycache.iterdir()] == ["other.cpython-311.pyc"]
@@ -0,0 +1,28 @@
+import os
+from pathlib import Path
+
+from poetry_patches.cache import OutputCache
+
+
+def test_output_cache(tmp_path: Path) -> None:
+    cache = OutputCache(tmp_path)
+    key = cache.key(b"original", "diff")
+
+    assert cache.read(key) is None
+    cache.store(key, b"patched")
+    assert cache.read(key) == b"patched"
+    assert cache.key(b"original", "other diff") != key
+
+
+def test_output_cache_prune(tmp_path: Path) -> None:
+    cache = OutputCache(tmp_path, max_size=20)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.store(key, b"0123456789")
+        os.utime(tmp_path / key, ns=(i, i))
+    # Reading an entry makes it the most recently used.
+    cache.read("a")
+
+    assert cache.prune() == 1
+    assert sorted(path.name for path, _ in cache.entries()) == ["a", "c"]
+    assert cache.prune(0) == 2
+    assert cache.entries() == []
@@ -0,0 +1,79 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from poetry_patches.distributions import Distributions
+
+
+def make_distribution(
+    site_packages: Path, name: str, version: str, pth: str | None = None
+) -> None:
+    dist_info = site_packages / f"{name.replace('-', '_')}-{version}.dist-info"
+    dist_info.mkdir(parents=True)
+    (dist_info / "METADATA").write_text(
+        f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n"
+    )
+    record = [f"{dist_info.name}/METADATA,,", f"{dist_info.name}/RECORD,,"]
+    if pth is not None:
+        (site_packages / f"{name}.pth").write_text(f"# comment\nimport os\n{pth}\n")
+        record.append(f"{name}.pth,,")
+    (dist_info / "RECORD").write_text("\n".join(record))
+
+
+class TestDistributions:
+    @pytest.fixture(autouse=True)
+    def set_up(self, tmp_path: Path) -> None:
+        self.site_packages = tmp_path / "site-packages"
+        self.site_packages.mkdir()
+        self.cache = tmp_path / "distributions.json"
+
+    def test_find(self) -> None:
+        make_distribution(self.site_packages, "Foo.Bar", "1.0")
+
+        distributions = Distributions.get([self.site_packages], cache=None)
+
+        assert distributions.find("foo-bar") == ("1.0", [self.site_packages.resolve()])
+        assert distributions.find("FOO_BAR") == ("1.0", [self.site_packages.resolve()])
+        assert distributions.find("baz") is None
+
+    def test_record(self) -> None:
+        make_distribution(self.site_packages, "foo", "1.0")
+        record = next(self.site_packages.glob("*.dist-info")) / "RECORD"
+
+        distributions = Distributions.get([self.site_packages], cache=None)
+
+        assert distributions.record("foo") == record.stat().st_mtime_ns
+        assert distributions.record("bar") is None
+
+    def test_find_pth(self, tmp_path: Path) -> None:
+        src = tmp_path / "src"
+        src.mkdir()
+        make_distribution(self.site_packages, "editable", "1.0", pth=str(src))
+
+        distributions = Distributions.get([self.site_packages], cache=None)
+
+        assert distributions.find("editable") == (
+            "1.0",
+            [self.site_packages.resolve(), src.resolve()],
+        )
+
+    def test_cache(self) -> None:
+        make_distribution(self.site_packages, "foo", "1.0")
+        Distributions.get([self.site_packages], cache=self.cache)
+
+        data = json.loads(self.cache.read_text())
+        data["distributions"]["foo"]["version"] = "cached"
+        self.cache.write_text(json.dumps(data))
+
+        distributions = Distributions.get([self.site_packages], cache=self.cache)
+        assert distributions.find("foo")[0] == "cached"
+
+        make_distribution(self.site_packages, "bar", "2.0")
+        stat = self.site_packages.stat()
+        os.utime(self.site_packages, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+        distributions = Distributions.get([self.site_packages], cache=self.cache)
+        assert distributions.find("foo")[0] == "1.0"
+        assert distributions.find("bar")[0] == "2.0"
@@ -0,0 +1,56 @@
+import sys
+import venv
+from pathlib import Path
+
+import pytest
+from cleo.io.null_io import NullIO
+from cleo.testers.command_tester import CommandTester
+from poetry.utils.env import VirtualEnv
+
+from poetry_patches.commands import PatchesRevertCommand
+from poetry_patches.envs import get_env
+from poetry_patches.patcher import PoetryPatcher
+from poetry_patches.state.backup import Backup
+from tests import PATCHES
+from tests.test_poetry_patcher import get_diffs
+
+
+def test_get_env_interpreter() -> None:
+    env = get_env(Path(sys.executable))
+
+    assert env.path == Path(sys.prefix)
+    assert env.is_venv() == (sys.prefix != sys.base_prefix)
+
+
+def test_get_env_virtualenv(tmp_path: Path) -> None:
+    venv.create(tmp_path / "venv")
+
+    env = get_env(tmp_path / "venv")
+
+    assert isinstance(env, VirtualEnv)
+    assert env.path == (tmp_path / "venv").resolve()
+    # The interpreter of the directory gives the same environment.
+    assert get_env(env.python).path == env.path
+
+
+def test_revert_env(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    diffs = get_diffs(PATCHES.resolve() / "pass_on_line_add_file_exists")
+    monkeypatch.chdir(tmp_path)
+    venv.create(tmp_path / "venv")
+    env = get_env(tmp_path / "venv")
+    backup = Backup.for_env(env.path)
+    Backup.init_dir(backup.backups)
+    file = tmp_path / "pass_on_line_add_file_exists.txt"
+    file.write_text("Lorem\nipsum\ndolor")
+    patcher = PoetryPatcher(None, NullIO(), backup)
+    patcher.apply_package("package", tmp_path, "1.0", diffs)
+    tester = CommandTester(PatchesRevertCommand())
+
+    assert tester.execute("other --env venv") == 1
+    assert "'other' has no patches" in tester.io.fetch_error()
+    assert file.read_text() == "Lorem\nipsum\ndolor\nsit"
+
+    assert tester.execute("package --env venv") == 0
+    assert "1 restored" in tester.io.fetch_output()
+    assert file.read_text() == "Lorem\nipsum\ndolor"
+    assert backup.get_packages() == {}
@@ -0,0 +1,103 @@
+import hashlib
+import threading
+from pathlib import Path
+
+import pytest
+
+from poetry_patches.cache import PatchCache
+from poetry_patches.fetcher import Fetcher
+
+
+class Response:
+    def __init__(self, content: bytes, status_code: int = 200, headers=None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+class Session:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def get(self, uri: str, timeout: float, headers=None) -> Response:
+        with self.lock:
+            self.calls.append((uri, timeout))
+        if headers and headers.get("If-None-Match") == "etag":
+            return Response(b"", status_code=304)
+        return Response(uri.encode(), headers={"ETag": "etag"})
+
+
+@pytest.fixture
+def fetcher() -> Fetcher:
+    fetcher = Fetcher(max_workers=4, timeout=5.0)
+    fetcher.session = Session()
+    return fetcher
+
+
+def test_fetch_local(fetcher: Fetcher, tmp_path: Path) -> None:
+    file = tmp_path / "local.diff"
+    file.write_text("local")
+
+    assert fetcher.fetch(str(file)) == "local"
+    assert fetcher.session.calls == []
+
+
+def test_fetch_all(fetcher: Fetcher, tmp_path: Path) -> None:
+    file = tmp_path / "local.diff"
+    file.write_text("local")
+    uris = [f"https://example.com/{i}.diff" for i in range(10)]
+
+    texts = fetcher.fetch_all([*uris, str(file), uris[0]])
+
+    assert list(texts) == [*uris, str(file)]
+    assert texts[str(file)] == "local"
+    assert all(texts[uri] == uri for uri in uris)
+    assert sorted(fetcher.session.calls) == sorted((uri, 5.0) for uri in uris)
+
+
+def test_fetch_sha256(fetcher: Fetcher, tmp_path: Path) -> None:
+    file = tmp_path / "local.diff"
+    file.write_text("local")
+    sha256 = hashlib.sha256(b"local").hexdigest()
+
+    assert fetcher.fetch(f"{file}#sha256={sha256}") == "local"
+    with pytest.raises(ValueError):
+        fetcher.fetch(f"{file}#sha256={'0' * 64}")
+
+
+class TestFetcherCache:
+    URL = "https://example.com/cached.diff"
+
+    @pytest.fixture(autouse=True)
+    def set_up(self, fetcher: Fetcher, tmp_path: Path) -> None:
+        self.fetcher = fetcher
+        self.fetcher.cache = PatchCache(tmp_path / "cache")
+
+    def test_revalidate(self) -> None:
+        assert self.fetcher.fetch(self.URL) == self.URL
+        assert self.fetcher.fetch(self.URL) == self.URL
+        assert len(self.fetcher.session.calls) == 2
+        assert self.fetcher.cache.get_entry(self.URL)["etag"] == "etag"
+
+    def test_pinned(self) -> None:
+        sha256 = hashlib.sha256(self.URL.encode()).hexdigest()
+        self.fetcher.fetch(self.URL)
+
+        assert self.fetcher.fetch(f"{self.URL}#sha256={sha256}") == self.URL
+        assert len(self.fetcher.session.calls) == 1
+
+    def test_offline(self) -> None:
+        self.fetcher.offline = True
+        with pytest.raises(ValueError):
+            self.fetcher.fetch(self.URL)
+
+        self.fetcher.offline = False
+        self.fetcher.fetch(self.URL)
+        self.fetcher.offline = True
+
+        assert self.fetcher.fetch(self.URL) == self.URL
+        assert len(self.fetcher.session.calls) == 1
@@ -1,5 +1,8 @@
+import threading
 from pathlib import Path
 
+import pytest
+
 from poetry_patches.state.meta import Meta
 from tests.conftest import assert_meta
 
@@ -15,3 +18,65 @@ def test_set_backup(meta: Meta, meta_path: Path) -> None:
 def test_clear(meta: Meta, meta_path: Path) -> None:
     meta.clear()
     assert_meta(meta_path, {"backups": {}})
+
+
+def test_references(meta: Meta) -> None:
+    meta.set_backup("/a", "/backup")
+    meta.set_backup("/b", "/backup")
+    meta.set_backup("/c", None)
+
+    assert meta.get_references("/backup") == 2
+    meta.set_backup("/b", "/other")
+    meta.delete_backup("/c")
+    assert meta.get_references("/backup") == 1
+    assert meta.get_references("/other") == 1
+    assert meta.get_references(None) == 0
+
+
+def test_transaction(meta: Meta, meta_path: Path) -> None:
+    with meta.transaction():
+        meta.set_backup("/a/b/c", "/d/e/f")
+        meta.dump()
+        assert not meta_path.exists()
+        assert meta.journal.exists()
+
+    assert_meta(meta_path, {"backups": {"/a/b/c": "/d/e/f"}})
+    assert not meta.journal.exists()
+
+
+def test_replay(meta: Meta, meta_path: Path) -> None:
+    meta.set_backup("/a/b/c", "/d/e/f")
+    meta.dump()
+
+    with pytest.raises(KeyboardInterrupt):
+        with meta.transaction():
+            meta.delete_backup("/a/b/c")
+            meta.set_backup("/g/h/i", None)
+            # Simulate a process killed before the commit.
+            meta.dump = lambda: None
+            raise KeyboardInterrupt
+    with meta.journal.open("a") as f:
+        f.write('["set_backup", "/j/k')
+
+    meta = Meta(meta_path)
+    meta.load()
+
+    assert meta.get_backups() == {"/g/h/i": None}
+
+
+def test_transaction_lock(meta: Meta, meta_path: Path) -> None:
+    other = Meta(meta_path)
+    events = []
+
+    def run() -> None:
+        with other.transaction():
+            events.append("other")
+
+    with meta.transaction():
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join(0.2)
+        events.append("meta")
+    thread.join()
+
+    assert events == ["meta", "other"]
@@ -0,0 +1,87 @@
+import subprocess
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from cleo.events.console_events import TERMINATE
+from cleo.events.console_terminate_event import ConsoleTerminateEvent
+from cleo.events.event_dispatcher import EventDispatcher
+from cleo.io.buffered_io import BufferedIO
+from cleo.io.inputs.string_input import StringInput
+from poetry.console.application import Application
+from poetry.console.commands.install import InstallCommand
+
+from poetry_patches.commands import PatchesApplyCommand
+from poetry_patches.distributions import Distributions
+from poetry_patches.fetcher import Fetcher
+from poetry_patches.patcher import PoetryPatcher
+from poetry_patches.plugins import PoetryPatchesPlugin
+from tests.test_poetry_patcher import make_poetry
+
+
+def test_import_is_lazy() -> None:
+    code = (
+        "import sys\n"
+        "from poetry.console.application import Application\n"
+        "from poetry_patches.plugins import PoetryPatchesPlugin\n"
+        "PoetryPatchesPlugin().activate(Application())\n"
+        "print(sorted(m for m in sys.modules if m.startswith(('poetry_patches', "
+        "'whatthepatch', 'requests'))))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=Path(__file__).parents[1],
+    ).stdout
+
+    assert output.strip() == "['poetry_patches', 'poetry_patches.plugins']"
+
+
+def test_activate() -> None:
+    application = Application()
+
+    PoetryPatchesPlugin().activate(application)
+
+    assert application.command_loader.names[-7:] == [
+        "patches apply",
+        "patches revert",
+        "patches check",
+        "patches cache",
+        "patches status",
+        "patches migrate",
+        "patches gc",
+    ]
+    assert isinstance(application.find("patches apply"), PatchesApplyCommand)
+    assert PoetryPatchesPlugin.reapply in application.event_dispatcher.get_listeners(
+        TERMINATE
+    )
+
+
+def test_reapply_error(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    command = InstallCommand()
+    command.set_poetry(make_poetry({"package": ["https://example.com/1.diff"]}))
+    command.set_env(SimpleNamespace(path=tmp_path))
+    io = BufferedIO(StringInput(""))
+    io.input.bind(command.definition)
+    command._io = io
+    entry = {"version": "1.0", "roots": [str(tmp_path)]}
+    monkeypatch.setattr(
+        PoetryPatcher,
+        "get_distributions",
+        lambda self: Distributions({"package": entry}),
+    )
+
+    def fetch_all(self, uris: list[str]) -> dict[str, str]:
+        raise ValueError("'https://example.com/1.diff' doesn't match its sha256")
+
+    monkeypatch.setattr(Fetcher, "fetch_all", fetch_all)
+    event = ConsoleTerminateEvent(command, io, 0)
+
+    PoetryPatchesPlugin.reapply(event, TERMINATE, EventDispatcher())
+
+    assert event.exit_code == 0
+    assert "doesn't match its sha256" in io.fetch_error()
@@ -1,14 +1,31 @@
+import time
 from pathlib import Path
+from types import SimpleNamespace
 
 import pytest
+import whatthepatch
+from cleo.io.buffered_io import BufferedIO
+from cleo.io.outputs.output import Verbosity
 
+from poetry_patches.cache import OutputCache, ParseCache
+from poetry_patches.distributions import Distributions
 from poetry_patches.patcher import PoetryPatcher
+from poetry_patches.state.backup import Backup
+from poetry_patches.state.meta import Meta
+from poetry_patches.state.sqlite import SqliteMeta
+from poetry_patches.utils import hash_bytes, hash_file
 from tests import PATCHES
 from tests.conftest import assert_meta
+from tests.test_distributions import make_distribution
 
 
 def get_diffs(directory: Path) -> list[str]:
-    return [str(path) for path in directory.glob("*.diff")]
+    return [str(path) for path in sorted(directory.glob("*.diff"))]
+
+
+def make_poetry(config: dict[str, list[str]]) -> SimpleNamespace:
+    pyproject = SimpleNamespace(data={"tool": {"poetry-patches": config}})
+    return SimpleNamespace(pyproject=pyproject)
 
 
 class TestPoetryPatcher:
@@ -182,8 +199,7 @@ class TestPoetryPatcher:
         backups = list(self.backups_path.glob("*"))
         assert len(backups) == 1
         backup = backups[0]
-        assert backup.name.startswith("pass_on_line_add_file_exists_")
-        assert backup.name.endswith(".txt")
+        assert backup.name == hash_bytes(b"Lorem\nipsum\ndolor")
         assert_meta(
             self.meta_path, {"backups": {str(file.resolve()): str(backup.resolve())}}
         )
@@ -250,5 +266,552 @@ class TestPoetryPatcher:
         assert file_2.read_text() == "Lorem\nipsum\ndolor\nsit"
 
         # backups
+        backup = self.backups_path / hash_bytes(b"Lorem\nipsum\ndolor")
+        assert list(self.backups_path.glob("*")) == [backup]
+        assert_meta(
+            self.meta_path,
+            {
+                "backups": {
+                    str(file_1.resolve()): str(backup.resolve()),
+                    str(file_2.resolve()): None,
+                }
+            },
+        )
+
+        self.poetry_patcher.backup.revert()
+
+        assert file_1.read_text() == "Lorem\nipsum\ndolor"
+        assert not file_2.exists()
+
+    def test_apply_package(self) -> None:
+        file = self.tmp_path / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        diffs = get_diffs(PATCHES / "pass_on_line_add_file_exists")
+
+        self.poetry_patcher.apply_package("package", self.tmp_path, "1.0", diffs)
+
+        assert file.read_text() == "Lorem\nipsum\ndolor\nsit"
+        backups = list(self.backups_path.glob("*"))
+        assert len(backups) == 1
+        package = self.poetry_patcher.backup.get_package("package")
+        assert package["version"] == "1.0"
+        assert package["patches"] == {
+            diffs[0]: {
+                "sha256": hash_bytes(Path(diffs[0]).read_bytes()),
+                "files": [str(file.resolve())],
+            }
+        }
+        assert package["files"] == {str(file.resolve()): hash_file(file)}
+        assert package["complete"]
+
+    def test_apply_packages_incomplete(self) -> None:
+        file = self.tmp_path / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        diffs = [
+            *get_diffs(PATCHES / "fail_on_update_if_doesnt_exist"),
+            *get_diffs(PATCHES / "pass_on_line_add_file_exists"),
+        ]
+        other = get_diffs(PATCHES / "fail_on_delete_if_doesnt_exist")
+
+        self.poetry_patcher.apply_packages(
+            [
+                ("package", [self.tmp_path], "1.0", diffs),
+                ("other", [self.tmp_path], "1.0", other),
+            ]
+        )
+
+        assert file.read_text() == "Lorem\nipsum\ndolor\nsit"
+        assert not self.poetry_patcher.backup.get_package("package")["complete"]
+        assert not self.poetry_patcher.backup.get_package("other")["complete"]
+
+    def test_apply_package_unchanged(self) -> None:
+        file = self.tmp_path / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        diffs = get_diffs(PATCHES / "pass_on_line_add_file_exists")
+
+        self.poetry_patcher.apply_package("package", self.tmp_path, "1.0", diffs)
+        backups = list(self.backups_path.glob("*"))
+        meta = self.meta_path.read_text()
+        self.poetry_patcher.apply_package("package", self.tmp_path, "1.0", diffs)
+
+        assert file.read_text() == "Lorem\nipsum\ndolor\nsit"
+        assert list(self.backups_path.glob("*")) == backups
+        assert self.meta_path.read_text() == meta
+
+    def test_apply_package_changed(self) -> None:
+        file = self.tmp_path / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        diffs = get_diffs(PATCHES / "pass_on_line_add_file_exists")
+
+        self.poetry_patcher.apply_package("package", self.tmp_path, "1.0", diffs)
+        file.write_text("changed")
+        self.poetry_patcher.apply_package("package", self.tmp_path, "1.0", diffs)
+
+        assert self.poetry_patcher.errors == 0
+        assert file.read_text() == "Lorem\nipsum\ndolor\nsit"
+
+    def test_apply_package_reinstalled(self) -> None:
+        file = self.tmp_path / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        diffs = get_diffs(PATCHES / "pass_on_line_add_file_exists")
+        packages = [("package", [self.tmp_path], "1.0", diffs)]
+
+        self.poetry_patcher.apply_packages(packages, {"package": 1})
+        # The installer overwrites the patched files.
+        file.write_text("Lorem\nipsum\ndolor")
+        self.poetry_patcher.apply_packages(packages, {"package": 2})
+
+        assert self.poetry_patcher.errors == 0
+        assert file.read_text() == "Lorem\nipsum\ndolor\nsit"
+        assert len(list(self.backups_path.glob("*"))) == 1
+        assert self.poetry_patcher.backup.get_package("package")["record"] == 2
+
+    def test_reapply(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        file = self.tmp_path / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        diffs = get_diffs(PATCHES / "pass_on_line_add_file_exists")
+        self.poetry_patcher.poetry = make_poetry({"package": diffs})
+        entry = {"version": "1.0", "roots": [str(self.tmp_path)], "record": 1}
+        distributions = Distributions({"package": entry})
+        monkeypatch.setattr(
+            self.poetry_patcher, "get_distributions", lambda: distributions
+        )
+
+        self.poetry_patcher.apply()
+        file.write_text("Lorem\nipsum\ndolor")
+        self.poetry_patcher.reapply()
+
+        # Not reinstalled, the files aren't even looked at.
+        assert file.read_text() == "Lorem\nipsum\ndolor"
+
+        entry["record"] = 2
+        self.poetry_patcher.reapply()
+
+        assert self.poetry_patcher.errors == 0
+        assert file.read_text() == "Lorem\nipsum\ndolor\nsit"
+
+    def test_reapply_uninstalled(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        file = self.tmp_path / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        diffs = get_diffs(PATCHES / "pass_on_line_add_file_exists")
+        other = get_diffs(PATCHES / "pass_on_line_adds")
+        self.poetry_patcher.poetry = make_poetry({"package": diffs, "other": other})
+        entries = {
+            "package": {"version": "1.0", "roots": [str(self.tmp_path)], "record": 1}
+        }
+        monkeypatch.setattr(
+            self.poetry_patcher,
+            "get_distributions",
+            lambda: Distributions(entries),
+        )
+        self.poetry_patcher.apply()
+        fetched = []
+        fetch_all = self.poetry_patcher.fetcher.fetch_all
+        monkeypatch.setattr(
+            self.poetry_patcher.fetcher,
+            "fetch_all",
+            lambda uris: fetched.extend(uris) or fetch_all(uris),
+        )
+
+        # `other` isn't installed, its patches aren't fetched again.
+        self.poetry_patcher.reapply()
+
+        assert fetched == []
+
+        # Uninstalled after it was patched, it's forgotten.
+        del entries["package"]
+        self.poetry_patcher.reapply()
+
+        assert fetched == []
+        assert self.poetry_patcher.backup.get_packages() == {}
+
+    def test_apply_keys(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        file = self.tmp_path / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        self.poetry_patcher.poetry = make_poetry(
+            {
+                "package": get_diffs(PATCHES / "pass_on_line_add_file_exists"),
+                "other": get_diffs(PATCHES / "pass_on_line_adds"),
+            }
+        )
+        entry = {"version": "1.0", "roots": [str(self.tmp_path)]}
+        distributions = Distributions({"package": entry, "other": entry})
+        monkeypatch.setattr(
+            self.poetry_patcher, "get_distributions", lambda: distributions
+        )
+
+        self.poetry_patcher.apply(["package"])
+
+        assert file.read_text() == "Lorem\nipsum\ndolor\nsit"
+        assert not (self.tmp_path / "pass_on_line_adds.txt").exists()
+        assert list(self.poetry_patcher.backup.get_packages()) == ["package"]
+
+    def test_apply_edited_patch(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        file = self.tmp_path / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        patch = self.tmp_path / "1.diff"
+        diff = (PATCHES / "pass_on_line_add_file_exists" / "1.diff").read_text()
+        patch.write_text(diff)
+        self.poetry_patcher.poetry = make_poetry({"package": [str(patch)]})
+        distributions = Distributions(
+            {"package": {"version": "1.0", "roots": [str(self.tmp_path)]}}
+        )
+        monkeypatch.setattr(
+            self.poetry_patcher, "get_distributions", lambda: distributions
+        )
+
+        self.poetry_patcher.apply()
+        patch.write_text(diff.replace("+sit", "+amet"))
+        self.poetry_patcher.apply(["package"])
+
+        assert self.poetry_patcher.errors == 0
+        assert file.read_text() == "Lorem\nipsum\ndolor\namet"
+
+    def test_apply_legacy(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        file = self.tmp_path / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        diffs = get_diffs(PATCHES / "pass_on_line_add_file_exists")
+        self.poetry_patcher.apply_package("package", self.tmp_path, "1.0", diffs)
+        package = self.poetry_patcher.backup.get_package("package")
+        # Recorded by an older version, with the hash of each patch only.
+        package["patches"] = {diffs[0]: package["patches"][diffs[0]]["sha256"]}
+        self.poetry_patcher.backup.set_package("package", package)
+        self.poetry_patcher.poetry = make_poetry({"package": diffs})
+        distributions = Distributions(
+            {"package": {"version": "1.0", "roots": [str(self.tmp_path)]}}
+        )
+        monkeypatch.setattr(
+            self.poetry_patcher, "get_distributions", lambda: distributions
+        )
+
+        self.poetry_patcher.apply()
+
+        assert self.poetry_patcher.errors == 0
+        assert file.read_text() == "Lorem\nipsum\ndolor\nsit"
+        package = self.poetry_patcher.backup.get_package("package")
+        assert package["patches"][diffs[0]]["files"] == [str(file.resolve())]
+
+    def test_revert_package(self) -> None:
+        file = self.tmp_path / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        diffs = get_diffs(PATCHES / "pass_on_line_add_file_exists")
+
+        self.poetry_patcher.apply_package("package", self.tmp_path, "1.0", diffs)
+        self.poetry_patcher.revert_package("package")
+
+        assert file.read_text() == "Lorem\nipsum\ndolor"
+        assert list(self.backups_path.glob("*")) == []
+        assert_meta(self.meta_path, {"backups": {}, "packages": {}})
+
+    def test_revert_package_sqlite(self) -> None:
+        file = self.tmp_path / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        diffs = get_diffs(PATCHES / "pass_on_line_add_file_exists")
+        meta = SqliteMeta(self.tmp_path / "meta.db")
+        self.poetry_patcher.backup = Backup(meta, self.backups_path)
+
+        self.poetry_patcher.apply_package("package", self.tmp_path, "1.0", diffs)
+        assert file.read_text() == "Lorem\nipsum\ndolor\nsit"
+        assert list(meta.get_packages()) == ["package"]
+        self.poetry_patcher.revert_package("package")
+
+        assert file.read_text() == "Lorem\nipsum\ndolor"
         assert list(self.backups_path.glob("*")) == []
-        assert_meta(self.meta_path, {"backups": {str(file_2.resolve()): None}})
+        assert meta.get_backups() == {}
+        assert meta.get_packages() == {}
+        meta.close()
+
+    def test_apply_patches_coalesced(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        file = self.tmp_path / "coalesced.txt"
+        file.write_text("a\nb\nc\n")
+        patches = self.tmp_path / "patches"
+        patches.mkdir()
+        header = "--- a/coalesced.txt\n+++ b/coalesced.txt\n"
+        (patches / "1.diff").write_text(f"{header}@@ -1,3 +1,3 @@\n a\n-b\n+B\n c\n")
+        (patches / "2.diff").write_text(f"{header}@@ -1,3 +1,3 @@\n a\n B\n-c\n+C\n")
+        (patches / "3.diff").write_text(
+            "diff --git a/coalesced.txt b/coalesced_2.txt\n"
+            "similarity index 100%\n"
+            "rename from coalesced.txt\n"
+            "rename to coalesced_2.txt\n"
+        )
+        writes = []
+        write_bytes = Path.write_bytes
+        monkeypatch.setattr(
+            Path,
+            "write_bytes",
+            lambda path, data: writes.append(path.name) or write_bytes(path, data),
+        )
+
+        self.poetry_patcher.apply_patches(self.tmp_path, get_diffs(patches))
+
+        assert self.poetry_patcher.errors == 0
+        assert not file.exists()
+        assert (self.tmp_path / "coalesced_2.txt").read_text() == "a\nB\nC\n"
+        assert writes == ["coalesced_2.txt"]
+        assert len(list(self.backups_path.glob("*"))) == 1
+
+        self.poetry_patcher.backup.revert()
+
+        assert file.read_text() == "a\nb\nc\n"
+        assert not (self.tmp_path / "coalesced_2.txt").exists()
+
+    def test_apply_patches_stream(self) -> None:
+        self.poetry_patcher.stream_size = 0
+        file = self.tmp_path / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        file.chmod(0o640)
+        diffs = get_diffs(PATCHES / "pass_on_line_add_file_exists")
+
+        self.poetry_patcher.apply_patches(self.tmp_path, diffs)
+
+        assert self.poetry_patcher.errors == 0
+        assert file.read_text() == "Lorem\nipsum\ndolor\nsit"
+        assert file.stat().st_mode & 0o777 == 0o640
+        assert [path.name for path in self.tmp_path.glob(".tmp_*")] == []
+
+        self.poetry_patcher.backup.revert()
+
+        assert file.read_text() == "Lorem\nipsum\ndolor"
+
+    def test_apply_patches_jobs(self) -> None:
+        self.poetry_patcher.jobs = 4
+        diffs = [
+            *get_diffs(PATCHES / "pass_on_rename_and_update"),
+            *get_diffs(PATCHES / "pass_on_line_adds"),
+            *get_diffs(PATCHES / "pass"),
+        ]
+
+        self.poetry_patcher.apply_patches(self.tmp_path, diffs)
+
+        assert self.poetry_patcher.errors == 0
+        assert not (self.tmp_path / "pass.txt").exists()
+        assert not (self.tmp_path / "pass_on_rename_and_update.txt").exists()
+        text = (self.tmp_path / "pass_on_rename_and_update_2.txt").read_text()
+        assert "labore" not in text
+        text = (self.tmp_path / "pass_on_line_adds.txt").read_text()
+        assert "maxime" in text
+        assert "delectus" in text
+
+    def test_apply_patches_jobs_output(self, backup: Backup) -> None:
+        diffs = [
+            *get_diffs(PATCHES / "pass_on_rename_and_update"),
+            *get_diffs(PATCHES / "fail_on_update_if_doesnt_exist"),
+            *get_diffs(PATCHES / "pass"),
+        ]
+        outputs = []
+
+        for jobs in (1, 4):
+            io = BufferedIO()
+            io.set_verbosity(Verbosity.DEBUG)
+            target_dir = self.tmp_path / str(jobs)
+            target_dir.mkdir()
+            PoetryPatcher(None, io, backup, jobs=jobs).apply_patches(target_dir, diffs)
+            output = io.fetch_output() + io.fetch_error()
+            outputs.append(output.replace(str(target_dir), ""))
+
+        assert outputs[0] == outputs[1]
+
+    def test_apply_packages_roots(self) -> None:
+        roots = [self.tmp_path / "root_1", self.tmp_path / "root_2"]
+        for root in roots:
+            root.mkdir()
+        file = roots[1] / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        diffs = get_diffs(PATCHES / "pass_on_line_add_file_exists")
+
+        self.poetry_patcher.apply_packages([("package", roots, "1.0", diffs)])
+
+        assert self.poetry_patcher.errors == 0
+        assert file.read_text() == "Lorem\nipsum\ndolor\nsit"
+
+    def test_parse_cache(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        self.poetry_patcher.parse_cache = ParseCache(self.tmp_path / "parsed")
+        diffs = get_diffs(PATCHES / "pass_on_rename_and_update")
+
+        parsed = [self.poetry_patcher.parse_patch(diff) for diff in diffs]
+        monkeypatch.setattr(whatthepatch, "parse_patch", None)
+        cached = [self.poetry_patcher.parse_patch(diff) for diff in diffs]
+
+        assert [[str(d) for d in p] for p in parsed] == [
+            [str(d) for d in c] for c in cached
+        ]
+        diff = cached[1][0]
+        assert diff.old_path == "pass_on_rename_and_update.txt"
+        assert diff.new_path == "pass_on_rename_and_update_2.txt"
+        assert diff.header.new_version == "10d8e2b3"
+        assert diff.changes[0].line == "sed"
+
+    def test_output_cache(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        self.poetry_patcher.output_cache = OutputCache(self.tmp_path / "outputs")
+        file = self.tmp_path / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        diffs = get_diffs(PATCHES / "pass_on_line_add_file_exists")
+
+        self.poetry_patcher.apply_patches(self.tmp_path, diffs)
+        self.poetry_patcher.backup.revert()
+
+        def patch(diff, content: bytes) -> bytes:
+            raise AssertionError("not cached")
+
+        monkeypatch.setattr(PoetryPatcher, "patch", staticmethod(patch))
+        self.poetry_patcher.apply_patches(self.tmp_path, diffs)
+
+        assert self.poetry_patcher.errors == 0
+        assert file.read_text() == "Lorem\nipsum\ndolor\nsit"
+
+    def make_env(self, name: str) -> tuple[SimpleNamespace, Backup]:
+        site_packages = self.tmp_path / name / "site-packages"
+        make_distribution(site_packages, "package", "1.0")
+        file = site_packages / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        env = SimpleNamespace(
+            path=self.tmp_path / name,
+            site_packages=SimpleNamespace(candidates=[site_packages]),
+        )
+        state = self.tmp_path / name / "state"
+        backup = Backup(Meta(state / "meta.json"), state / "backups")
+        backup.backups.mkdir(parents=True)
+        return env, backup
+
+    def test_apply_envs(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        diffs = get_diffs(PATCHES / "pass_on_line_add_file_exists")
+        self.poetry_patcher.poetry = make_poetry({"package": diffs})
+        envs = [self.make_env(name) for name in ("env_1", "env_2", "env_3")]
+        loaded = []
+        load_patch = PoetryPatcher.load_patch
+
+        def load_slowly(patcher: PoetryPatcher, uri: str) -> list:
+            # Long enough for the environments to race for the same patch.
+            loaded.append(uri)
+            time.sleep(0.05)
+            return load_patch(patcher, uri)
+
+        monkeypatch.setattr(PoetryPatcher, "load_patch", load_slowly)
+
+        self.poetry_patcher.apply_envs(envs)
+
+        assert self.poetry_patcher.errors == 0
+        assert loaded == diffs
+        for env, backup in envs:
+            [site_packages] = env.site_packages.candidates
+            file = site_packages / "pass_on_line_add_file_exists.txt"
+            assert file.read_text() == "Lorem\nipsum\ndolor\nsit"
+            assert list(backup.get_packages()) == ["package"]
+            assert len(list(backup.backups.glob("*"))) == 1
+            assert (backup.meta.meta.parent / "distributions.json").exists()
+        assert not self.meta_path.exists()
+
+    def test_apply_envs_failure(self) -> None:
+        diffs = get_diffs(PATCHES / "pass_on_line_add_file_exists")
+        self.poetry_patcher.poetry = make_poetry({"package": diffs})
+        envs = [self.make_env(name) for name in ("env_1", "env_2", "env_3")]
+        # The site-packages of the second one can't be listed.
+        envs[1][0].site_packages = None
+
+        with pytest.raises(RuntimeError, match="1 of 3 environments"):
+            self.poetry_patcher.apply_envs(envs)
+
+        assert self.poetry_patcher.errors == 1
+        for env, backup in [envs[0], envs[2]]:
+            [site_packages] = env.site_packages.candidates
+            file = site_packages / "pass_on_line_add_file_exists.txt"
+            assert file.read_text() == "Lorem\nipsum\ndolor\nsit"
+            assert list(backup.get_packages()) == ["package"]
+
+    def test_check(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        file = self.tmp_path / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        self.poetry_patcher.poetry = make_poetry(
+            {
+                "package": get_diffs(PATCHES / "pass_on_line_add_file_exists"),
+                "failing": get_diffs(PATCHES / "fail_on_update_if_doesnt_exist"),
+                "missing": get_diffs(PATCHES / "pass"),
+            }
+        )
+        distributions = Distributions(
+            {
+                "package": {"version": "1.0", "roots": [str(self.tmp_path)]},
+                "failing": {"version": "1.0", "roots": [str(self.tmp_path)]},
+            }
+        )
+        monkeypatch.setattr(
+            self.poetry_patcher, "get_distributions", lambda: distributions
+        )
+
+        report = self.poetry_patcher.check()
+
+        assert report["package"] == {"status": "ok", "errors": []}
+        assert report["failing"]["status"] == "failed"
+        assert len(report["failing"]["errors"]) == 1
+        assert report["missing"] == {"status": "skipped", "errors": []}
+        assert file.read_text() == "Lorem\nipsum\ndolor"
+        assert list(self.backups_path.glob("*")) == []
+        assert not self.meta_path.exists()
+
+    def test_check_read_only_caches(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        file = self.tmp_path / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        self.poetry_patcher.poetry = make_poetry(
+            {"package": get_diffs(PATCHES / "pass_on_line_add_file_exists")}
+        )
+        distributions = Distributions(
+            {"package": {"version": "1.0", "roots": [str(self.tmp_path)]}}
+        )
+        monkeypatch.setattr(
+            self.poetry_patcher, "get_distributions", lambda: distributions
+        )
+        parsed = self.tmp_path / "parsed"
+        outputs = self.tmp_path / "outputs"
+        self.poetry_patcher.parse_cache = ParseCache(parsed, read_only=True)
+        self.poetry_patcher.output_cache = OutputCache(outputs, read_only=True)
+
+        report = self.poetry_patcher.check()
+
+        assert report["package"] == {"status": "ok", "errors": []}
+        assert not parsed.exists()
+        assert not outputs.exists()
+
+    def test_check_patched(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        file = self.tmp_path / "pass_on_line_add_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        diffs = get_diffs(PATCHES / "pass_on_line_add_file_exists")
+        self.poetry_patcher.apply_patches(self.tmp_path, diffs)
+        self.poetry_patcher.poetry = make_poetry({"package": diffs})
+        distributions = Distributions(
+            {"package": {"version": "1.0", "roots": [str(self.tmp_path)]}}
+        )
+        monkeypatch.setattr(
+            self.poetry_patcher, "get_distributions", lambda: distributions
+        )
+
+        report = self.poetry_patcher.check()
+
+        assert report["package"] == {"status": "ok", "errors": []}
+        assert file.read_text() == "Lorem\nipsum\ndolor\nsit"
+
+    def test_check_patched_rename(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        file = self.tmp_path / "pass_on_rename_and_update_file_exists.txt"
+        file.write_text("Lorem\nipsum\ndolor")
+        diffs = get_diffs(PATCHES / "pass_on_rename_and_update_file_exists")
+        self.poetry_patcher.poetry = make_poetry({"package": diffs})
+        distributions = Distributions(
+            {"package": {"version": "1.0", "roots": [str(self.tmp_path)]}}
+        )
+        monkeypatch.setattr(
+            self.poetry_patcher, "get_distributions", lambda: distributions
+        )
+        self.poetry_patcher.apply()
+
+        report = self.poetry_patcher.check()
+
+        assert report["package"] == {"status": "ok", "errors": []}
+        assert self.poetry_patcher.overlay is None
+        assert not file.exists()
+
+        # A later apply writes to disk again.
+        self.poetry_patcher.backup.revert()
+        self.poetry_patcher.apply()
+
+        renamed = self.tmp_path / "pass_on_rename_and_update_file_exists_2.txt"
+        assert renamed.read_text() == "Lorem\nipsum\ndolor\nsit"
@@ -0,0 +1,43 @@
+import json
+from pathlib import Path
+
+from poetry_patches.profiler import Profiler
+
+
+def test_disabled() -> None:
+    profiler = Profiler()
+
+    with profiler.phase("parse"):
+        pass
+
+    assert profiler.spans == []
+
+
+def test_summary() -> None:
+    profiler = Profiler()
+    profiler.enable()
+
+    with profiler.phase("parse", patch="a.diff"):
+        pass
+    with profiler.phase("parse", patch="b.diff"):
+        pass
+    with profiler.phase("meta"):
+        pass
+
+    summary = {name: count for name, count, _, _ in profiler.summary()}
+    assert summary == {"parse": 2, "meta": 1}
+
+
+def test_write_trace(tmp_path: Path) -> None:
+    profiler = Profiler()
+    profiler.enable()
+
+    with profiler.phase("diff", file="a.py"):
+        pass
+    profiler.write_trace(tmp_path / "trace.json")
+
+    trace = json.loads((tmp_path / "trace.json").read_text())
+    [event] = trace["traceEvents"]
+    assert event["name"] == "diff"
+    assert event["ph"] == "X"
+    assert event["args"] == {"file": "a.py"}
@@ -0,0 +1,35 @@
+import threading
+import time
+
+from poetry_patches.scheduler import Scheduler
+
+
+def test_run() -> None:
+    lock = threading.Lock()
+    order = []
+
+    def task(i: int, delay: float):
+        def run() -> int:
+            time.sleep(delay)
+            with lock:
+                order.append(i)
+            return i
+
+        return run
+
+    tasks = [
+        (task(0, 0.05), ["a"]),
+        (task(1, 0.0), ["b"]),
+        (task(2, 0.0), ["a", "c"]),
+        (task(3, 0.0), ["c"]),
+    ]
+
+    assert Scheduler(jobs=4).run(tasks) == [0, 1, 2, 3]
+    assert order.index(0) < order.index(2) < order.index(3)
+    assert order.index(1) < order.index(0)
+
+
+def test_run_sequential() -> None:
+    tasks = [((lambda i=i: i), ["a"]) for i in range(3)]
+
+    assert Scheduler(jobs=1).run(tasks) == [0, 1, 2]
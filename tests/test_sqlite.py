@@ -0,0 +1,135 @@
+import sqlite3
+import threading
+from pathlib import Path
+
+import pytest
+
+from poetry_patches.state.backup import Backup
+from poetry_patches.state.meta import Meta, migrate, open_meta
+from poetry_patches.state.sqlite import SqliteMeta
+from tests.conftest import assert_meta
+
+
+class TestSqliteMeta:
+    @pytest.fixture(autouse=True)
+    def set_up(self, tmp_path: Path) -> None:
+        self.tmp_path = tmp_path
+        self.meta = SqliteMeta(tmp_path / "meta.db")
+        yield
+        self.meta.close()
+
+    def test_backups(self) -> None:
+        self.meta.set_backup("/a", "/backup")
+        self.meta.set_backup("/b", "/backup")
+        self.meta.set_backup("/c", None)
+
+        assert self.meta.has_backup("/a")
+        assert self.meta.get_references("/backup") == 2
+        assert self.meta.get_references(None) == 1
+        self.meta.set_backup("/b", "/other")
+        assert self.meta.delete_backup("/c") is None
+        assert self.meta.delete_backup("/d") is None
+        assert self.meta.get_references("/backup") == 1
+        assert self.meta.get_backups() == {"/a": "/backup", "/b": "/other"}
+
+    def test_packages(self) -> None:
+        self.meta.set_package("package", {"version": "1.0", "files": {}})
+
+        assert self.meta.get_package("package") == {"version": "1.0", "files": {}}
+        assert self.meta.get_package("other") is None
+        self.meta.set_package("package", None)
+        assert self.meta.get_packages() == {}
+
+    def test_transaction(self) -> None:
+        other = SqliteMeta(self.meta.meta)
+        other.TIMEOUT = 0
+
+        with self.meta.transaction():
+            self.meta.set_backup("/a", None)
+            # Another run waits for the lock instead of interleaving its writes.
+            with pytest.raises(sqlite3.OperationalError, match="locked"):
+                with other.transaction():
+                    pass
+            assert other.get_backups() == {}
+
+        assert other.get_backups() == {"/a": None}
+        other.close()
+
+    def test_threads(self) -> None:
+        def set_backups(start: int) -> None:
+            for i in range(start, start + 50):
+                self.meta.set_backup(f"/{i}", None)
+
+        with self.meta.transaction():
+            threads = [
+                threading.Thread(target=set_backups, args=(i * 50,)) for i in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert len(self.meta.get_backups()) == 200
+
+    def test_clear(self, backups_path: Path) -> None:
+        backup = Backup(self.meta, backups_path)
+        file = self.tmp_path / "file.txt"
+        file.write_text("original")
+
+        backup.edit_or_delete(file)
+        file.write_text("patched")
+        backup.revert()
+
+        assert file.read_text() == "original"
+        assert self.meta.get_backups() == {}
+        assert list(backups_path.glob("*")) == []
+
+
+def test_migrate(meta: Meta, meta_path: Path) -> None:
+    meta.set_backup("/a", "/backup")
+    meta.set_package("package", {"version": "1.0", "files": {"/a": "abc"}})
+    meta.dump()
+
+    assert migrate(meta_path, "sqlite")
+    assert not meta_path.exists()
+    assert not meta.lock.exists()
+    database = open_meta(meta_path)
+    assert isinstance(database, SqliteMeta)
+    assert database.get_backups() == {"/a": "/backup"}
+    assert database.get_package("package") == {"version": "1.0", "files": {"/a": "abc"}}
+    database.close()
+
+    assert not migrate(meta_path, "sqlite")
+    assert migrate(meta_path, "json")
+    assert not meta_path.with_suffix(".db").exists()
+    assert isinstance(open_meta(meta_path), Meta)
+    assert_meta(
+        meta_path,
+        {
+            "backups": {"/a": "/backup"},
+            "packages": {"package": {"version": "1.0", "files": {"/a": "abc"}}},
+        },
+    )
+
+
+def test_migrate_concurrent(meta: Meta, meta_path: Path) -> None:
+    meta.set_backup("/a", None)
+    meta.dump()
+    thread = threading.Thread(target=migrate, args=(meta_path, "sqlite"))
+
+    with meta.transaction():
+        thread.start()
+        # The migration waits for the run in progress.
+        thread.join(0.2)
+        assert thread.is_alive()
+        meta.set_backup("/b", None)
+    thread.join()
+
+    database = open_meta(meta_path)
+    assert database.get_backups() == {"/a": None, "/b": None}
+    database.close()
+    # A run that opened the old state stops instead of writing it.
+    with pytest.raises(RuntimeError, match="moved"):
+        with Meta(meta_path).transaction():
+            pass
+    assert not meta_path.exists()
@@ -0,0 +1,56 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from poetry_patches.status import get_stat, get_status
+from poetry_patches.utils import hash_bytes, hash_file
+
+
+class TestStatus:
+    @pytest.fixture(autouse=True)
+    def set_up(self, tmp_path: Path) -> None:
+        self.tmp_path = tmp_path
+
+    def make_package(self, files: list[Path]) -> dict:
+        return {
+            "files": {str(file): hash_file(file) for file in files},
+            "stats": {str(file): get_stat(file) for file in files},
+        }
+
+    def test_get_status(self) -> None:
+        intact = self.tmp_path / "intact.txt"
+        intact.write_text("patched")
+        touched = self.tmp_path / "touched.txt"
+        touched.write_text("patched")
+        drifted = self.tmp_path / "drifted.txt"
+        drifted.write_text("patched")
+        missing = self.tmp_path / "missing.txt"
+        missing.write_text("patched")
+        deleted = self.tmp_path / "deleted.txt"
+        package = self.make_package([intact, touched, drifted, missing, deleted])
+
+        os.utime(touched, ns=(0, 0))
+        drifted.write_text("reinstalled")
+        missing.unlink()
+
+        assert get_status(package) == {
+            str(intact): "intact",
+            str(touched): "intact",
+            str(drifted): "drifted",
+            str(missing): "missing",
+            str(deleted): "intact",
+        }
+
+        deleted.write_text("reinstalled")
+
+        assert get_status(package)[str(deleted)] == "drifted"
+
+    def test_get_status_stat(self) -> None:
+        file = self.tmp_path / "file.txt"
+        file.write_text("patched")
+        package = self.make_package([file])
+        package["files"][str(file)] = hash_bytes(b"other")
+
+        # The stat data is unchanged, the file isn't hashed.
+        assert get_status(package) == {str(file): "intact"}
@@ -0,0 +1,78 @@
+import os
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from cleo.io.buffered_io import BufferedIO
+
+from poetry_patches import commands
+from poetry_patches.commands import PatchesApplyCommand
+from poetry_patches.watcher import Watcher, get_changed_packages, get_local_files
+
+
+def test_poll(tmp_path: Path) -> None:
+    file = tmp_path / "1.diff"
+    file.write_text("old")
+    other = tmp_path / "2.diff"
+    watcher = Watcher([file, other])
+
+    assert watcher.poll() == set()
+
+    file.write_text("new")
+    os.utime(file, ns=(0, 0))
+    other.write_text("created")
+
+    assert watcher.poll() == {file, other}
+    assert watcher.poll() == set()
+
+
+def test_get_local_files(tmp_path: Path) -> None:
+    file = tmp_path / "1.diff"
+    config = {
+        "package": [str(file), "https://example.com/1.diff#sha256=abc"],
+        "other": [str(file)],
+    }
+
+    assert get_local_files(config) == {file.resolve(): {"package", "other"}}
+
+
+def test_get_changed_packages(tmp_path: Path) -> None:
+    file = tmp_path / "1.diff"
+    old = {"package": [str(file)], "other": ["2.diff"], "removed": ["3.diff"]}
+    new = {"package": [str(file)], "other": ["2.diff"], "added": ["4.diff"]}
+
+    assert get_changed_packages(old, new, set()) == {"removed", "added"}
+    assert get_changed_packages(old, old, {file.resolve()}) == {"package"}
+
+
+def test_watch_error(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    pyproject = tmp_path / "pyproject.toml"
+    pyproject.write_text("")
+    patch = tmp_path / "1.diff"
+    patch.write_text("1")
+    command = PatchesApplyCommand()
+    command.set_poetry(SimpleNamespace(pyproject_path=pyproject))
+    command._io = BufferedIO()
+    patcher = SimpleNamespace(poetry_patches_config={"package": [str(patch)]})
+
+    # Each poll sees the patch saved again, until interrupted.
+    saves = iter(["22", "333"])
+
+    def sleep(interval: float) -> None:
+        if (content := next(saves, None)) is None:
+            raise KeyboardInterrupt
+        patch.write_text(content)
+
+    monkeypatch.setattr(commands.time, "sleep", sleep)
+    applied = []
+
+    def apply(keys: set[str]) -> None:
+        if not applied:
+            applied.append(None)
+            raise FileNotFoundError(f"'{patch}' doesn't exist")
+        applied.append(keys)
+
+    command.watch(patcher, apply, 0)
+
+    assert applied == [None, {"package"}]
+    assert "doesn't exist" in command.io.fetch_error()